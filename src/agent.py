@@ -1,9 +1,10 @@
 import logging
 import asyncio
 import os
+import time
 
-from twilio.rest import Client
-from typing import Optional
+from collections.abc import Awaitable, Iterable
+from typing import Callable, Optional
 from datetime import datetime
 
 import aiohttp
@@ -13,7 +14,6 @@ from dotenv import load_dotenv
 from livekit import (rtc, api)
 from livekit.agents import (
     Agent,
-    AgentServer,
     AgentSession,
     JobContext,
     JobProcess,
@@ -29,6 +29,18 @@ from livekit.plugins import noise_cancellation, silero, xai
 from livekit.plugins import deepgram
 #from livekit.agents import Worker, WorkerOptions
 
+from background_tasks import TaskSupervisor
+from call_metrics import CallMetrics, process_metrics
+from filler import ToolLatencyMasker, mask_tool_latency, preload_filler_clips
+from memory_diagnostics import MEMORY_DIAGNOSTICS, MemoryDiagnostics
+from caller_history import CallerRecord, caller_history, normalize_number
+from context_compaction import CONTEXT_COMPACTION, COMPACTION_LLM_MODEL, ContextCompactor, ResponseLatencyTracker
+from notifications import notification_aggregator, send_sms
+from dispatch import DRAIN_TIMEOUT_S, DrainingAgentServer, dispatch_agent_name, served_tenants
+from prompt import build_instructions, greeting
+from tenants import UNKNOWN_TENANT, tenant_for_room
+from website_cache import website_cache
+
 from typing import Optional
 from datetime import datetime
 from zoneinfo import ZoneInfo
@@ -104,12 +116,16 @@ class Assistant(Agent):
             company_address: str = "",
             company_hours: str = "",
             admin_phone: str = "",
-            instructions_specific: str = ""
+            instructions_specific: str = "",
+            known_caller: Optional[CallerRecord] = None
             ) -> None:
         self.formatted_caller = formatted_caller or "inconnue"
         self.spoken_caller = spoken_caller or "inconnue"
         self.room: rtc.Room | None = None
         self.admin_phone = admin_phone
+        self.metrics = CallMetrics()
+        self.tasks = TaskSupervisor(self.metrics)
+        self.filler: ToolLatencyMasker | None = None  # branché dans my_agent une fois la session créée
 
         logger.debug(f"AGENT_NAME: {agent_name}")
         logger.debug(f"COMPANY_NAME: {company_name}")
@@ -118,105 +134,31 @@ class Assistant(Agent):
         logger.debug(f"admin_phone: {admin_phone}")
         logger.debug(f"instructions_specific: {instructions_specific}")
 
-        base_instructions = (
-            f"Tu es {agent_name}, une réceptionniste virtuelle TRÈS chaleureuse, professionnelle et efficace pour la compagnie {company_name}.\n"
-            f"Imagine que tu souris largement en parlant — rends ta voix encore plus accueillante, sympathique et réconfortante.\n"
-            f"Tu parles en français québécois courant et poli, avec un ton naturel comme une vraie personne au téléphone au Québec.\n"
-            f"Tes réponses doivent être courtes et naturelles : maximum 2-3 phrases à la fois. Parle à un rythme détendu, avec des pauses naturelles.\n"
-            f"Utilise des contractions courantes (« j’peux », « c’est », « y’a », « j’vas », « laissez-moi »), mais RESTE TOUJOURS POLIE ET PROFESSIONNELLE.\n"
-            f"Évite ABSOLUMENT les expressions trop familières comme « bein », « chu », « moé », « toé ». Dis toujours « bien », « je suis », « moi », « vous ».\n"
-            f"Toujours vouvoyer l’appelant : utilise « vous », « laissez-moi », « pourriez-vous », etc. Jamais de tutoiement.\n"
-            f"Tu peux poursuivre en anglais si l’appelant est clairement anglophone.\n\n"
-
-            f"CRUCIAL : Tu DOIS TOUJOURS poser UNE SEULE question ou demande à la fois. Jamais deux ou plus dans la même réponse.\n"
-            f"Exemple à ÉVITER : « Quel est votre nom et quel est le sujet ? »\n"
-            f"Exemple correct : Demande d’abord une chose, attends la réponse complète, puis passe à la suivante.\n"
-            f"Progresse calmement, étape par étape, sans jamais regrouper ou anticiper.\n\n"
-
-            f"Quand l'appel commence, salue comme ça : « Bonjour, vous êtes bien chez {company_name}, mon nom est {agent_name}. Comment puis-je vous aider aujourd’hui ? »\n\n"
-
-            f"Prise de message ou rendez-vous :\n"
-            f"- Commence par demander la personne recherchée ou le département.\n"
-            f"- Ensuite, demande le sujet ou la raison de l'appel (une seule question).\n"
-            f"- Propose d'abord d'utiliser le numéro actuel pour le rappel : « Je peux utiliser le numéro d'où vous appelez, qui est le [numéro formaté lentement], ou préférez-vous m'en donner un autre ? »\n"
-            f"- Si l'appelant confirme le numéro actuel ou en donne un autre, note-le sans répéter inutilement.\n"
-            f"- Demande le nom complet seulement quand c'est nécessaire, et toujours séparément.\n"
-            f"- Une fois toutes les infos recueillies, répète UNE SEULE FOIS pour confirmation : « Juste pour confirmer : [nom], [numéro], [message/sujet]. C’est bien ça ? »\n"
-            f"- Pose toujours UNE SEULE question ou demande à la fois. Attends la réponse complète de l’appelant avant de continuer. Progresse étape par étape, calmement.\n"
-            f"- Une fois confirmé, appelle le tool take_message avec les paramètres exacts (name, callback_number, reason).\n"
-            f"- CRUCIAL : Après avoir appelé le tool take_message, dis IMMÉDIATEMENT sans attendre le résultat cette phrase finale comme dernière réponse : « Parfait, je transmets votre message dès que possible. Merci d'avoir appelé ! Passez une belle journée ! Au revoir ! »\n"
-            f"- IMMÉDIATEMENT après avoir fini de dire cette phrase (et seulement après), appelle le tool end_call pour terminer l'appel.\n"
-            f"- Ne dis RIEN d'autre. Ne pose plus de question. Ne relance pas.\n"
-            f"- CRUCIAL : Tu NE DOIS JAMAIS appeler le tool take_message avant d’avoir entendu et reçu une confirmation EXPLICITE de l’appelant APRÈS le récapitulatif (ex. « oui », « c’est correct », « parfait », « c’est ça »).\n"
-            f"- Si tu n’as pas encore la confirmation, tu NE FAIS RIEN et tu ATTENDS silencieusement la réponse.\n"
-            f"- Ne anticipe JAMAIS la confirmation. Même si tout semble complet, attends toujours la réponse verbale.\n"
-            f"- Si l’appelant ne confirme pas ou corrige → tu ajustes sans appeler le tool.\n"
-            f"- Ne laisse JAMAIS de silence prolongé après l'appel du tool. Parle tout de suite, même si le SMS est encore en cours d'envoi.\n"
-  
-            f"Demande d'informations générales (heures, adresse, service offert etc.) :\n"
-            f"- Réponds brièvement et chaleureusement.\n"
-            f"- Ensuite, demande : « Est-ce que je peux vous aider avec autre chose ? » ou « Y a-t-il autre chose que je peux faire pour vous ? »\n"
-            f"- Si l'appelant dit non ou reste silencieux (5-10 secondes), conclus avec : « Merci d'avoir appelé ! Passez une belle journée ! Au revoir ! »\n"
-            f"- Puis appelle IMMÉDIATEMENT end_call.\n\n"
-
-            f"Quand tu dois dire un numéro de téléphone, utilise TOUJOURS ce format précis et prononce-le lentement, groupe par groupe, à la québécoise :\n"
-            f"- Groupe par 3-3-4 : ex. pour (514) 947-4976 → « cinq un quatre... neuf quatre sept... quatre neuf sept six. »\n"
-            f"- Exemple pour (450) 808-0813 : « quatre cinq zéro... huit zéro huit... zéro huit un trois. »\n"
-            f"- Prononce toujours le 't' final de 'huit' clairement : « huit » (pas « hui »).\n"
-            f"- Pour 'quatre' dis « quatre », pour 'cinq' dis « cinq », etc. Jamais de style européen comme « quatre-vingt ».\n"
-            f"- Pause naturelle d’environ 1 seconde entre chaque groupe de chiffres.\n"
-            f"- Ne dis jamais le numéro en continu ou en format international (+1…). Utilise toujours ce format phonétique québécois.\n"
- 
-            f"- Pause naturelle entre chaque groupe.\n\n"
-
-            f"Nos bureaux sont ouverts du {company_hours}.\n"
-            f"L'adresse de nos bureau est le {company_address}.\n"
-            f"Reste toujours dans ton rôle. Ne mentionne jamais que tu es une IA.\n"
-            f"Si silence prolongé (>20 secondes), conclus poliment et appelle end_call.\n\n"
-
-            f"Quand l'appelant demande l'heure, la date ou le jour, utilise IMMÉDIATEMENT la tool get_current_datetime ou get_current_time.\n"
-            f"Pour infos détaillées sur le site, utilise IMMÉDIATEMENT fetch_company_website.\n\n"
-
-            f"RÉSUMÉ DES RÈGLES ABSOLUES :\n"
-            f"- Une seule question à la fois.\n"
-            f"- Attendre confirmation EXPLICITE avant tout tool.\n"
-            f"- Phrase finale TOUJOURS complète, immédiate et chaleureuse.\n"
-            f"- Ton ultra-chaleureux, québécois poli (jamais trop familier).\n"
-        )
-
-        # numéro de l'appelant est connue
-        if caller_number:
-            base_instructions += (
-                f"Information importante : l'appelant utilise actuellement le numéro de téléphone {caller_number}.\n"
-                f"Propose d'abord d'utiliser le numéro actuel pour le rappel avec CETTE phrase EXACTE :\n"
-                f"« Je peux utiliser le numéro d'où vous appelez, qui est le {self.spoken_caller}, ou préférez-vous m'en donner un autre ? »\n"
-                f"Prononce lentement, avec des pauses naturelles après chaque groupe de chiffres.\n\n"
-            )
-
-        # ajour des instructions spécific pour cette compagnie
-        if instructions_specific:
-            base_instructions += instructions_specific
-
-        # ajour pour tool fetch_company_website
-        base_instructions += (
-            f"Quand l'appelant demande des informations détaillées qui pourraient être sur le site web de {company_name} \n"
-            f"(services, tarifs, équipe, coordonnées complètes, promotions, etc.), utilise IMMÉDIATEMENT le tool fetch_company_website \n"
-            f"avec la section la plus pertinente ('accueil', 'services', 'contact', 'apropos', 'equipe'). \n"
-            f"Si tu cherches quelque chose de précis, passe-le dans 'query'. \n"
-            f"Ne l'utilise QUE pour l'entreprise en cours ({company_name}). \n"
-            f"Ensuite, résume les infos de façon naturelle, concise et chaleureuse à l'appelant.\n"
+        # Numéro de rappel mémorisé : seulement s'il se prononce (10 chiffres), sinon on repropose celui de l'appel
+        spoken_callback = None
+        if known_caller and len(normalize_number(known_caller.callback_number)) == 10:
+            spoken_callback = spoken_phone(known_caller.callback_number)
+
+        # Assemblage des sections (chaque règle une seule fois) + mesure et budget de tokens
+        self.prompt = build_instructions(
+            agent_name,
+            company_name,
+            company_address,
+            company_hours,
+            caller_number=caller_number,
+            spoken_caller=self.spoken_caller,
+            instructions_specific=instructions_specific,
+            caller_name=known_caller.name if known_caller else None,
+            spoken_callback=spoken_callback,
         )
-
-        # ajour pour tool get_current_time et get_current_datetime
-        #base_instructions += (
-        #    f"Quand l'appelant demande l'heure actuelle, utilise IMMÉDIATEMENT la tool get_current_time pour obtenir l'heure exacte à Montréal et réponds poliment avec cette information.\n"
-        #    f"Quand l'appelant demande la date, le jour de la semaine ou l'heure, utilise IMMÉDIATEMENT la tool get_current_datetime (ou get_current_time pour l'heure seule) pour répondre précisément.\n"
-        #)
+        base_instructions = self.prompt.text
+        self.metrics.observe("prompt.tokens", self.prompt.tokens)
 
         # LOG DES INSTRUCTIONS COMPLÈTES ENVOYÉES AU MODÈLE
         logger.info("=== INSTRUCTIONS SYSTÈME ENVOYÉES À GROK ===")
         logger.info(base_instructions)
         logger.info("=== FIN DES INSTRUCTIONS ===")
+        logger.info(f"Prompt {company_name} : ~{self.prompt.tokens} tokens (budget {self.prompt.budget}), sections {self.prompt.sections}")
 
         super().__init__(
             #instructions="""You are Grok, a maximally truthful and helpful AI built by xAI.
@@ -281,11 +223,36 @@ async def end_call(ctx: RunContext):
     
     return None  # Important : retourne None pour ne rien ajouter à la conversation (évite double au revoir)           
 
+async def send_message_sms(tenant_key: str, company: str, name: str, caller_number: str, final_callback: str, reason: str, admin_phone: str, callee_number: str, urgent: bool = False):
+    """Envoie le SMS à l'équipe (regroupé par compagnie, sauf urgence) et la confirmation à l'appelant (tâche de fond de take_message)."""
+    body = (
+        f"{'🚨 URGENT – ' if urgent else ''}📩 Nouveau message {company} !\n\n"
+        f"👤 De : {name}\n"
+        f"📞 Appelant : {format_phone(caller_number)}\n"
+        f"🔄 Rappel au : {format_phone(final_callback)}\n"
+        f"💬 Message : {reason}\n\n"
+        f"Heure : {datetime.now(TZ_MONTREAL).strftime('%Y-%m-%d %H:%M')}"
+    )        
+    await notification_aggregator().notify(tenant_key, company, admin_phone, callee_number, body, urgent=urgent)
+
+    # === NOUVEAU : SMS de confirmation à l'appelant (pour tester) === toujours envoyé tout de suite, jamais regroupé
+    confirmation_body = (
+        "Merci ! 😊\n"
+        f"Votre message a bien été transmis à l'équipe {company}.\n"
+        f"Nous vous rappelons au {format_phone(final_callback)} dès que possible.\n"
+        "Passez une belle journée !\n"
+        f"Amélie, réceptionniste virtuelle {company}"
+    )
+    await send_sms(final_callback, callee_number, confirmation_body)  # Ou caller_number si tu préfères forcer le numéro appelant
+    logger.info(f"SMS confirmation envoyé à l'appelant – {final_callback}")
+
 @function_tool
-async def take_message(ctx: RunContext, name: str, callback_number: Optional[str] = None, reason: str = ""):
-    """Enregistre un message laissé par l'appelant et envoie un SMS à l'équipe Telnek."""
-    await ctx.wait_for_playout()  # Au cas où, pour ne pas couper Amélie
-    
+async def take_message(ctx: RunContext, name: str, callback_number: Optional[str] = None, reason: str = "", urgent: bool = False):
+    """Enregistre un message laissé par l'appelant et envoie un SMS à l'équipe Telnek.
+
+    Args:
+        urgent: true seulement si l'appelant dit que c'est urgent (panne, danger, urgence) : l'équipe est avertie sans délai.
+    """
     job_ctx = get_job_context()
     if not job_ctx:
         logger.warning("Job context indisponible dans take_message")
@@ -295,13 +262,8 @@ async def take_message(ctx: RunContext, name: str, callback_number: Optional[str
     room_name = job_ctx.room.name
 
     # Détection de l'entreprise
-    if room_name.startswith("telnek-"):
-        company = "Telnek"
-    elif room_name.startswith("electrizone-"):
-        company = "ÉlectriZone"
-    else:
-        company = "Inconnue"
-
+    tenant = tenant_for_room(room_name)
+    company = tenant.company_name
     
     # Récupère le numéro appelant réel (via participant SIP)
     sip_participant = next(
@@ -319,44 +281,30 @@ async def take_message(ctx: RunContext, name: str, callback_number: Optional[str
     # Si pas de numéro de rappel spécifié → utilise le numéro appelant
     final_callback = callback_number or caller_number
     
-    # Envoie le SMS via Twilio
-    try:
-        client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
-        body = (
-            f"📩 Nouveau message {company} !\n\n"
-            f"👤 De : {name}\n"
-            f"📞 Appelant : {format_phone(caller_number)}\n"
-            f"🔄 Rappel au : {format_phone(final_callback)}\n"
-            f"💬 Message : {reason}\n\n"
-            f"Heure : {datetime.now(TZ_MONTREAL).strftime('%Y-%m-%d %H:%M')}"
-        )        
-        message = client.messages.create(
-            to=admin_phone,
-            from_=callee_number,
-            body=body
-        )
-        logger.info(f"SMS envoyé avec succès (SID: {message.sid}) pour {name}")
-
-        # === NOUVEAU : SMS de confirmation à l'appelant (pour tester) ===
-        confirmation_body = (
-            "Merci ! 😊\n"
-            f"Votre message a bien été transmis à l'équipe {company}.\n"
-            f"Nous vous rappelons au {format_phone(final_callback)} dès que possible.\n"
-            "Passez une belle journée !\n"
-            f"Amélie, réceptionniste virtuelle {company}"
-        )
-        confirmation_message = client.messages.create(
-            to=final_callback,  # Ou caller_number si tu préfères forcer le numéro appelant
-            from_=callee_number,
-            body=confirmation_body
-        )
-        logger.info(f"SMS confirmation envoyé à l'appelant (SID: {confirmation_message.sid}) – {final_callback}")
-
-    except Exception as e:
-        logger.error(f"Erreur envoi SMS Twilio : {e}")
+    # Envoi des SMS en tâche de fond : le tool retourne tout de suite (Amélie enchaîne sa phrase finale)
+    # et la fin du job attend l'envoi grâce au TaskSupervisor
+    ctx.session.current_agent.tasks.start(
+        send_message_sms(tenant.key, company, name, caller_number, final_callback, reason, admin_phone, callee_number, urgent),
+        name=f"take_message_sms:{final_callback}",
+    )
+    # Mémorise l'appelant : au prochain appel, on ne lui redemande ni son nom ni son numéro
+    ctx.session.current_agent.tasks.start(
+        asyncio.to_thread(caller_history().record, tenant.key, caller_number, name, final_callback, reason),
+        name=f"caller_history:{caller_number}",
+    )
         
     return None  # Le modèle ne dira rien automatiquement du tool
 
+def html_to_text(html: str) -> str:
+    """Extrait le texte lisible d'une page ; l'arbre BeautifulSoup est détruit avant de retourner."""
+    soup = BeautifulSoup(html, "html.parser")
+    try:
+        for element in soup(["script", "style", "nav", "header", "footer", "aside", "form"]):
+            element.decompose()
+        return soup.get_text(separator="\n", strip=True)
+    finally:
+        soup.decompose()  # casse les références parent/enfant pour libérer l'arbre tout de suite
+
 @function_tool
 async def fetch_company_website(ctx: RunContext, section: str = "accueil", query: str = "") -> str:
     """
@@ -404,28 +352,29 @@ async def fetch_company_website(ctx: RunContext, section: str = "accueil", query
     logger.info(f"Tool fetch_company_website appelé → Entreprise: {company} | URL: {url} | Query: {query}")
 
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=12)) as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    return f"Erreur : impossible de charger la page ({response.status}). Je peux vous donner les infos de base."
+        # Page déjà extraite par un appel précédent sur ce worker ?
+        text = await asyncio.to_thread(website_cache().get, url)
+        ctx.session.current_agent.metrics.incr("website_cache.hit" if text is not None else "website_cache.miss")
 
-                html = await response.text()
+        if text is None:
+            async with mask_tool_latency(ctx, "fetch_company_website"), aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=12)) as session:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        return f"Erreur : impossible de charger la page ({response.status}). Je peux vous donner les infos de base."
 
-                soup = BeautifulSoup(html, "html.parser")
-                for element in soup(["script", "style", "nav", "header", "footer", "aside", "form"]):
-                    element.decompose()
+                    html = await response.text()
+                    text = html_to_text(html)
 
-                text = soup.get_text(separator="\n", strip=True)
+                    max_length = 12000
+                    if len(text) > max_length:
+                        text = text[:max_length] + "\n\n... (texte tronqué)"
+                    await asyncio.to_thread(website_cache().put, url, text)
 
-                max_length = 12000
-                if len(text) > max_length:
-                    text = text[:max_length] + "\n\n... (texte tronqué)"
+        result = f"Contenu de la section '{section}' du site {company} ({url}) :\n\n{text}"
+        if query:
+            result += f"\n\nRecherche spécifique : {query}"
 
-                result = f"Contenu de la section '{section}' du site {company} ({url}) :\n\n{text}"
-                if query:
-                    result += f"\n\nRecherche spécifique : {query}"
-
-                return result
+        return result
 
     except Exception as e:
         logger.error(f"Erreur fetch site {company} : {e}")
@@ -481,17 +430,71 @@ async def get_current_datetime(ctx: RunContext) -> str:
     # Phrase naturelle et chaleureuse
     return f"Aujourd'hui, on est {jour_semaine} le {jour} {mois} {annee}, et il est {heure} à Montréal."
 
-server = AgentServer()
+# Logging des transcripts en temps réel (client et Amélie)
+def log_transcription(transcription: rtc.Transcription):
+    if transcription.segments:
+        text = " ".join(seg.text for seg in transcription.segments).strip()
+        if not text:
+            return
+
+        participant = transcription.participant
+        if participant and participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP:
+            logger.info(f"👤 Client a dit : {text}")
+        else:
+            logger.info(f"🤖 Amélie a dit : {text}")
+
+
+def start_call_lifecycle(
+        room: rtc.Room,
+        assistant: Assistant,
+        closeables: Iterable = (),
+        memory_diagnostics: Optional[MemoryDiagnostics] = None,
+        ) -> Callable[[], Awaitable[None]]:
+    """
+    Branche ce qui vit le temps d'un appel (transcripts) et retourne finish_call, le shutdown
+    hook qui défait tout. Les SMS admin en attente ne sont pas envoyés ici : c'est le balayage du
+    processus principal (DrainingAgentServer) qui les regroupe, même d'un appel à l'autre. Le test de soak mémoire passe par ici aussi.
+    """
+    room.on("transcription_received", log_transcription)
+    logger.info("Logging des transcripts activé via room events (client et Amélie)")
+
+    # On laisse finir les tâches de fond (SMS urgents, mise en attente des autres) avant de journaliser
+    async def finish_call():
+        await assistant.tasks.drain()
+        # Sinon la room garde le handler, et l'Assistant garde la room (et ses participants) vivante
+        room.off("transcription_received", log_transcription)
+        if assistant.filler:
+            assistant.filler.close()
+        for closeable in closeables:
+            closeable.close()
+        assistant.room = None
+        if memory_diagnostics:
+            memory_diagnostics.finish(assistant.metrics).log(room.name)
+        assistant.metrics.log_summary(logger)
+        # Compteurs partagés du processus de l'appel (SMS admin mis en attente, urgents…) ;
+        # les métriques de l'appel n'y sont pas ajoutées : elles viennent d'être journalisées
+        process_metrics.log_summary(logger)
+
+    return finish_call
+
+
+# SIGTERM → vidange : plus de nouveaux appels, les appels en cours se terminent, SMS en attente envoyés
+server = DrainingAgentServer(drain_timeout=DRAIN_TIMEOUT_S)
 
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    preload_filler_clips(served_tenants())  # seulement les compagnies de ce worker
+    caller_history()  # ouvre les bases SQLite avant le premier appel
+    notification_aggregator()
+    website_cache()
 
 
 server.setup_fnc = prewarm
 
 
-@server.rtc_session()
+# Worker dédié à un groupe de compagnies : enregistré sous « receptionniste-<groupe> » (dispatch explicite)
+@server.rtc_session(agent_name=dispatch_agent_name())
 async def my_agent(ctx: JobContext):
 #def prewarm(proc: JobProcess):
 #    proc.userdata["vad"] = silero.VAD.load()
@@ -504,6 +507,12 @@ async def my_agent(ctx: JobContext):
         "room": ctx.room.name,
     }
 
+    # Diagnostic mémoire (MEMORY_DIAGNOSTICS=1) : instantané au début, rapport à la fin du job
+    memory_diagnostics = None
+    if MEMORY_DIAGNOSTICS:
+        memory_diagnostics = MemoryDiagnostics()
+        memory_diagnostics.start()
+
     # Set up a voice AI pipeline using OpenAI, Cartesia, Deepgram, and the LiveKit turn detector
     #session = AgentSession(
         # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
@@ -551,41 +560,14 @@ async def my_agent(ctx: JobContext):
 
     # Détection du client par le nom de la room
     logger.info(f"Room name: {ctx.room.name}")
-    if ctx.room.name.startswith("telnek-"):
-        room_prefix = "telnek-"
-        company_name = "Telnek"
-        company_address = "sept cents soixante et quatre, Avenue Prieur à Laval, Québec. H7E 2V3"
-        company_hours = "lundi au vendredi de 9 heure du matin a 5 heure de l'après-midi"
-        admin_phone = "+15149474976"
-        callee_number = "+14388147547"
-        instructions_specific = (
-            f"Telnek est une entreprise spécialisée dans les services de centre d'appels, de télémarketing et de centre de contact.\n"
-        )    
-    elif ctx.room.name.startswith("electrizone-"):
-        room_prefix = "electrizone-"
-        company_name = "ÉlectriZone"
-        company_address = "deux milles dix, rue Alphonse, à Saint-Pascal, Québec. G0L 3Y0"
-        company_hours = "lundi au vendredi de 8 heure à 17 heure"
-        admin_phone = "+15149474976"
-        callee_number = "+14388141491"
-        instructions_specific = (
-            "Le nom de l’entreprise est « ÉlectriZone », prononcé « Élec-tri » légère pause puis « Zone » (accent sur Zone). Jamais « Électric Zone » ou « Électrique Zone ».\n"
-            "ÉlectriZone se spécialise dans les services électriques résidentiel, commercial et agricole.\n"
-            "Propriétaire : Guillaume Boucher.\n"
-            "Région desservie : Kamouraska et environs.\n"
-            "Pour plus de détails ou projets en cours, mentionne que nous sommes actifs sur Facebook (ÉlectriZone).\n"
-            "Ajout pour la prise de message pour électrizone: \n"
-            "- Après avoir la raison de l’appel, demande toujours : « Est-ce que c’est pour une installation résidentielle, commerciale ou agricole ? »\n"
-            "- Attends la réponse avant de continuer vers le numéro/nom/récap.\n"
-        ) 
-    else:
-        room_prefix = "Inconnue"
-        company_name = "Inconnue"
-        company_address = "Inconnue"
-        company_hours = "Inconnue"
-        admin_phone = "Inconnue"
-        callee_number = "Inconnue"
-        instructions_specific = ""
+    tenant = tenant_for_room(ctx.room.name)
+    room_prefix = tenant.room_prefix
+    company_name = tenant.company_name
+    company_address = tenant.company_address
+    company_hours = tenant.company_hours
+    admin_phone = tenant.admin_phone
+    callee_number = tenant.callee_number
+    instructions_specific = tenant.instructions_specific
 
     globals()["admin_phone"] = admin_phone
     globals()["callee_number"] = callee_number
@@ -646,6 +628,13 @@ async def my_agent(ctx: JobContext):
         spoken_caller = "inconnu"
         clean_digits = ""
 
+    # Appelant déjà connu ? (lecture de clé primaire SQLite, < 1 ms)
+    lookup_started_at = time.perf_counter()
+    known_caller = caller_history().lookup(tenant.key, clean_digits)
+    lookup_ms = (time.perf_counter() - lookup_started_at) * 1000
+    if known_caller:
+        logger.info(f"Appelant connu : {known_caller.name} ({known_caller.call_count} appel(s), rappel au {format_phone(known_caller.callback_number)}) – recherche {lookup_ms:.2f} ms")
+
     # To use a realtime model instead of a voice pipeline, use the following session setup instead.
     # (Note: This is for the OpenAI Realtime API. For other providers, see https://docs.livekit.io/agents/models/realtime/))
     # 1. Install livekit-agents[openai]
@@ -674,9 +663,31 @@ async def my_agent(ctx: JobContext):
         company_address=company_address,
         company_hours=company_hours,
         admin_phone=admin_phone,
-        instructions_specific=instructions_specific
+        instructions_specific=instructions_specific,
+        known_caller=known_caller
         )
 
+    # Métriques de l'appel + clips d'attente pendant les tools lents
+    assistant.metrics.scope = ctx.room.name
+    assistant.metrics.observe("caller_history.lookup_ms", lookup_ms)
+    assistant.metrics.incr("caller_history.hit" if known_caller else "caller_history.miss")
+    if tenant is not UNKNOWN_TENANT and tenant.key not in served_tenants():
+        # règle de dispatch mal configurée : on répond quand même, mais sans état chaud pour cette compagnie
+        assistant.metrics.incr("dispatch.outside_group")
+        logger.warning(f"Appel {tenant.key} reçu par un worker du groupe {dispatch_agent_name() or 'automatique'}")
+    assistant.filler = ToolLatencyMasker(session, tenant=tenant.key, metrics=assistant.metrics)
+
+    # Longs appels : les anciens tours sont remplacés par un résumé ; latence mesurée avec ou sans compaction
+    latency_tracker = ResponseLatencyTracker(session, assistant.metrics)
+    compactor = None
+    if CONTEXT_COMPACTION:
+        compactor = ContextCompactor(session, assistant, inference.LLM(model=COMPACTION_LLM_MODEL), assistant.metrics)
+
+    # Handlers de la room, puis nettoyage de fin de job (y compris après end_call)
+    closeables = [latency_tracker] + ([compactor] if compactor else [])
+    finish_call = start_call_lifecycle(ctx.room, assistant, closeables, memory_diagnostics)
+    ctx.add_shutdown_callback(finish_call)
+
     # Démarre la session avec cette instance
     await session.start(
         agent=assistant,
@@ -701,27 +712,10 @@ async def my_agent(ctx: JobContext):
     assistant.room = ctx.room
     logger.info("Room stockée dans l'instance Assistant pour le tool hangup")
 
-    # Logging des transcripts en temps réel (client et Amélie)
-    def on_transcription(transcription: rtc.Transcription):
-        if transcription.segments:
-            text = " ".join(seg.text for seg in transcription.segments).strip()
-            if not text:
-                return
-        
-            participant = transcription.participant
-            if participant and participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP:
-                logger.info(f"👤 Client a dit : {text}")
-            else:
-                logger.info(f"🤖 Amélie a dit : {text}")
-
-    # Abonne à l'événement de transcription de la room
-    ctx.room.on("transcription_received", on_transcription)
-    logger.info("Logging des transcripts activé via room events (client et Amélie)")
-
     # greeting immédiat pour les appels entrants (Twilio/SIP)
 
     # Greeting fixe et fiable via le modèle realtime
-    welcome_message = f"Bonjour, vous êtes bien chez {company_name}, mon nom est {agent_name}. Comment puis-je vous aider aujourd’hui ?"
+    welcome_message = greeting(company_name, agent_name, known_caller.name if known_caller else None)
 
     greeting_instructions = (
         f"Dis EXACTEMENT ceci comme première phrase, sans rien ajouter, sans rien modifier et sans poser d'autre question :\n"
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Coroutine
+from typing import Any, Optional
+
+from call_metrics import CallMetrics
+
+logger = logging.getLogger("agent")
+
+# Durée max d'une tâche de fond (ex. envoi des SMS Twilio)
+BACKGROUND_TASK_TIMEOUT_S = float(os.getenv("BACKGROUND_TASK_TIMEOUT_S", "30"))
+# Temps accordé aux tâches restantes à la fin du job (doit rester sous shutdown_process_timeout = 10 s)
+BACKGROUND_DRAIN_TIMEOUT_S = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT_S", "8"))
+
+
+class TaskSupervisor:
+    """
+    Tâches de fond d'un appel : les tools y lancent leurs effets de bord (SMS, etc.)
+    et retournent tout de suite. Chaque tâche a un nom, un timeout et ses erreurs sont
+    journalisées au lieu d'être perdues. drain() est appelé par le shutdown hook du job.
+    """
+
+    def __init__(self, metrics: CallMetrics) -> None:
+        self.metrics = metrics
+        self.errors: list[tuple[str, BaseException]] = []
+        self._tasks: dict[asyncio.Task, str] = {}
+
+    @property
+    def pending(self) -> list[str]:
+        return [name for task, name in self._tasks.items() if not task.done()]
+
+    def start(
+            self,
+            coro: Coroutine[Any, Any, Any],
+            name: str,
+            timeout: Optional[float] = BACKGROUND_TASK_TIMEOUT_S,
+            ) -> asyncio.Task:
+        task = asyncio.create_task(self._run(coro, name, timeout), name=name)
+        self._tasks[task] = name
+        task.add_done_callback(lambda t: self._tasks.pop(t, None))
+        self.metrics.incr("background.started")
+        logger.debug(f"Tâche de fond lancée : {name}")
+        return task
+
+    async def _run(self, coro: Coroutine[Any, Any, Any], name: str, timeout: Optional[float]) -> None:
+        started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(coro, timeout)
+            self.metrics.incr("background.succeeded")
+        except asyncio.TimeoutError as e:
+            self.metrics.incr("background.timed_out")
+            self.errors.append((name, e))
+            logger.error(f"Tâche de fond {name} interrompue après {timeout} s")
+        except asyncio.CancelledError:
+            self.metrics.incr("background.cancelled")
+            raise
+        except Exception as e:
+            self.metrics.incr("background.failed")
+            self.errors.append((name, e))
+            logger.exception(f"Erreur dans la tâche de fond {name} : {e}")
+        finally:
+            self.metrics.observe("background.duration_s", time.perf_counter() - started_at)
+
+    async def drain(self, timeout: float = BACKGROUND_DRAIN_TIMEOUT_S) -> None:
+        """Attend les tâches restantes au plus `timeout` secondes, puis annule celles qui traînent."""
+        tasks = dict(self._tasks)
+        if not tasks:
+            return
+
+        logger.info(f"Fin d'appel : attente de {len(tasks)} tâche(s) de fond ({', '.join(tasks.values())})")
+        started_at = time.perf_counter()
+        _, still_pending = await asyncio.wait(tasks.keys(), timeout=timeout)
+        self.metrics.observe("background.drain_s", time.perf_counter() - started_at)
+
+        for task in still_pending:
+            self.metrics.incr("background.pending_at_shutdown")
+            logger.warning(f"Tâche de fond {tasks[task]} toujours en cours après {timeout} s → annulée")
+            task.cancel()
+        if still_pending:
+            await asyncio.wait(still_pending)
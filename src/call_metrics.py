@@ -0,0 +1,57 @@
+import logging
+from collections import defaultdict, deque
+from typing import Optional
+
+# Nombre max d'échantillons gardés par mesure (borne la mémoire d'une mesure observée en boucle)
+MAX_SAMPLES = 1000
+
+
+class CallMetrics:
+    """
+    Compteurs et mesures d'un appel (ou du processus), journalisés à la fin du job.
+    Les noms suivent la forme "module.mesure", ex. "filler.played" ou "tool.take_message.latency_s".
+    """
+
+    def __init__(self, scope: str = "") -> None:
+        self.scope = scope
+        self.counters: dict[str, int] = defaultdict(int)
+        self.values: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+    def incr(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def observe(self, name: str, value: float) -> None:
+        self.values[name].append(value)
+
+    def count(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def ratio(self, numerator: str, denominator: str) -> Optional[float]:
+        total = self.count(denominator)
+        if not total:
+            return None
+        return self.count(numerator) / total
+
+    def summary(self) -> dict[str, float]:
+        result: dict[str, float] = dict(sorted(self.counters.items()))
+        for name, values in sorted(self.values.items()):
+            if not values:
+                continue
+            ordered = sorted(values)
+            result[f"{name}.count"] = len(ordered)
+            result[f"{name}.p50"] = round(ordered[len(ordered) // 2], 4)
+            result[f"{name}.max"] = round(ordered[-1], 4)
+        return result
+
+    def log_summary(self, logger: logging.Logger) -> None:
+        summary = self.summary()
+        if not summary:
+            return
+        logger.info(f"=== MÉTRIQUES {self.scope} ===")
+        for name, value in summary.items():
+            logger.info(f"  {name} = {value}")
+
+
+# Compteurs du processus : un processus de job ne sert qu'un appel ; le processus principal du worker
+# (balayage des SMS admin, vidange) vit, lui, toute la durée du déploiement
+process_metrics = CallMetrics("processus")
@@ -0,0 +1,105 @@
+import functools
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("agent")
+
+# Historique local des appelants (une base SQLite par worker / volume)
+CALLER_HISTORY_DB = os.getenv("CALLER_HISTORY_DB", str(Path(__file__).resolve().parent.parent / "data" / "caller_history.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS callers (
+    tenant          TEXT NOT NULL,
+    number          TEXT NOT NULL,
+    name            TEXT NOT NULL,
+    callback_number TEXT NOT NULL,
+    last_reason     TEXT NOT NULL DEFAULT '',
+    call_count      INTEGER NOT NULL DEFAULT 1,
+    last_call_at    TEXT NOT NULL,
+    PRIMARY KEY (tenant, number)
+) WITHOUT ROWID
+"""
+
+# Lecture d'un appelant : doit rester une recherche par clé primaire (voir caller_history_report.py)
+LOOKUP_SQL = (
+    "SELECT tenant, number, name, callback_number, last_reason, call_count, last_call_at "
+    "FROM callers WHERE tenant = ? AND number = ?"
+)
+
+
+def normalize_number(raw_number: Optional[str]) -> str:
+    """Clé de l'historique : 10 chiffres nord-américains (sans +1), sinon les chiffres bruts."""
+    number = ''.join(filter(str.isdigit, raw_number or ""))
+    if number.startswith('1') and len(number) == 11:
+        number = number[1:]
+    return number
+
+
+@dataclass(frozen=True)
+class CallerRecord:
+    tenant: str
+    number: str
+    name: str
+    callback_number: str
+    last_reason: str
+    call_count: int
+    last_call_at: str
+
+
+class CallerHistory:
+    """
+    Table SQLite indexée par (compagnie, numéro normalisé) : la recherche est une lecture
+    de clé primaire (B-tree, WITHOUT ROWID), sous la milliseconde même avec des millions de lignes.
+    Un historique est propre à chaque compagnie : un appelant de Telnek n'est pas reconnu chez ÉlectriZone.
+    """
+
+    def __init__(self, path: str = CALLER_HISTORY_DB) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Les écritures passent par asyncio.to_thread → connexion partagée protégée par un verrou
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+
+    def lookup(self, tenant: str, raw_number: Optional[str]) -> Optional[CallerRecord]:
+        number = normalize_number(raw_number)
+        if not number:
+            return None
+        with self._lock:
+            row = self._conn.execute(LOOKUP_SQL, (tenant, number)).fetchone()
+        return CallerRecord(*row) if row else None
+
+    def record(self, tenant: str, raw_number: Optional[str], name: str, callback_number: str, reason: str = "") -> None:
+        number = normalize_number(raw_number)
+        if not number or not name:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO callers (tenant, number, name, callback_number, last_reason, call_count, last_call_at) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (tenant, number) DO UPDATE SET "
+                "name = excluded.name, callback_number = excluded.callback_number, "
+                "last_reason = excluded.last_reason, call_count = call_count + 1, last_call_at = excluded.last_call_at",
+                (tenant, number, name, normalize_number(callback_number) or number, reason,
+                 datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@functools.cache
+def caller_history() -> CallerHistory:
+    """Historique partagé par tous les appels du processus (ouvert au prewarm)."""
+    logger.info(f"Historique des appelants : {CALLER_HISTORY_DB}")
+    return CallerHistory(CALLER_HISTORY_DB)
@@ -0,0 +1,67 @@
+"""
+Mesure hors ligne de la recherche d'un appelant dans un gros historique :
+p50 / p99 de CallerHistory.lookup sur une base de --rows lignes (1 million par défaut).
+
+    uv run python src/caller_history_report.py
+    uv run python src/caller_history_report.py --rows 5000000 --lookups 5000
+
+Retourne 1 si le p99 dépasse --max-p99-ms (1 ms par défaut). Le temps dépend de la machine :
+à lancer sur le matériel des workers plutôt qu'en CI.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from caller_history import LOOKUP_SQL, CallerHistory
+
+FIRST_NUMBER = 4_000_000_000
+
+
+def fill(history: CallerHistory, rows: int) -> None:
+    with history._lock:
+        history._conn.execute("BEGIN")
+        history._conn.executemany(
+            "INSERT INTO callers VALUES ('telnek', ?, 'Client', ?, '', 1, '2026-01-01T00:00:00+00:00')",
+            ((f"{n:010d}", f"{n:010d}") for n in range(FIRST_NUMBER, FIRST_NUMBER + rows)),
+        )
+        history._conn.execute("COMMIT")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Latence de recherche dans l'historique des appelants")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--max-p99-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = CallerHistory(str(Path(tmp) / "history.sqlite3"))
+        started_at = time.perf_counter()
+        fill(history, args.rows)
+        print(f"{args.rows} lignes insérées en {time.perf_counter() - started_at:.1f} s")
+        plan = history._conn.execute(f"EXPLAIN QUERY PLAN {LOOKUP_SQL}", ("telnek", "")).fetchall()
+        print(f"Plan : {' | '.join(row[-1] for row in plan)}")
+
+        timings = []
+        for _ in range(args.lookups):
+            number = f"{random.randrange(FIRST_NUMBER, FIRST_NUMBER + args.rows):010d}"
+            started_at = time.perf_counter()
+            if history.lookup("telnek", number) is None:
+                print(f"Appelant {number} introuvable", file=sys.stderr)
+                return 1
+            timings.append((time.perf_counter() - started_at) * 1000)
+        history.close()
+
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(len(timings) * 0.99)]
+    status = "  ⚠ AU-DESSUS DU SEUIL" if p99 > args.max_p99_ms else ""
+    print(f"{args.lookups} recherches : p50 {p50:.3f} ms | p99 {p99:.3f} ms (seuil {args.max_p99_ms} ms){status}")
+    return 1 if p99 > args.max_p99_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
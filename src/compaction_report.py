@@ -0,0 +1,96 @@
+"""
+Mesure hors ligne de l'effet de la compaction du contexte sur la latence des réponses :
+un long appel scripté est rejoué tour par tour avec le modèle de remplacement,
+sans puis avec ContextCompactor, et la latence est affichée selon la longueur de l'appel.
+
+    uv run python src/compaction_report.py [nombre de tours]
+"""
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+from livekit.agents import Agent, AgentSession
+
+from call_metrics import CallMetrics
+from context_compaction import ContextCompactor
+from prompt import build_instructions
+from stand_in_llm import StandInLLM
+from tenants import TENANTS
+
+agent_name = os.getenv("AGENT_NAME", "Amélie")
+DEFAULT_TURNS = 40
+BUCKET = 10
+
+CALLER_LINES = (
+    "Bonjour, j'appelle pour un projet de rénovation électrique dans mon sous-sol à Laval.",
+    "On voudrait ajouter une dizaine de prises, des luminaires encastrés et changer le panneau pour du 200 ampères.",
+    "C'est une maison de 1975, le filage est encore en aluminium à certains endroits, je ne sais pas si c'est un problème.",
+    "Idéalement on aimerait que les travaux commencent avant la fin du mois, on a un entrepreneur pour le gypse qui attend.",
+    "Mon nom c'est Julie Tremblay, et vous pouvez me rappeler au cinq un quatre, cinq cinq cinq, zéro un deux trois.",
+    "Ah, et est-ce que vous faites aussi les bornes de recharge pour les voitures électriques ?",
+)
+AGENT_LINES = (
+    "Je comprends, merci pour ces détails. Est-ce qu'il y a autre chose que je devrais noter pour l'équipe ?",
+    "Parfait, je le note. Pourriez-vous me préciser la date qui vous conviendrait le mieux ?",
+)
+SUMMARY_REPLY = json.dumps({
+    "nom": "Julie Tremblay",
+    "numero_rappel": "5145550123",
+    "raison": "rénovation électrique du sous-sol (prises, luminaires, panneau 200 A)",
+    "details": "maison de 1975 avec filage aluminium ; borne de recharge possible",
+    "etape": "infos recueillies, reste la confirmation",
+}, ensure_ascii=False)
+
+
+async def simulate_call(instructions: str, turns: int, compaction: bool) -> tuple[list[float], list[int]]:
+    """Latence (secondes) et taille du contexte reçu par le modèle, pour chaque tour de l'appel."""
+    latencies = []
+    async with (
+        StandInLLM(replies=list(AGENT_LINES)) as stand_in,
+        StandInLLM(replies=[SUMMARY_REPLY]) as summarizer,
+        AgentSession(llm=stand_in) as session,
+    ):
+        agent = Agent(instructions=instructions)
+        await session.start(agent)
+        compactor = ContextCompactor(session, agent, summarizer, CallMetrics("rapport")) if compaction else None
+        for user_input in itertools.islice(itertools.cycle(CALLER_LINES), turns):
+            started_at = time.perf_counter()
+            await session.run(user_input=user_input)
+            latencies.append(time.perf_counter() - started_at)
+        if compactor:
+            compactor.close()
+    return latencies, stand_in.context_tokens
+
+
+async def main() -> int:
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TURNS
+    tenant = TENANTS["electrizone"]
+    instructions = build_instructions(
+        agent_name, tenant.company_name, tenant.company_address, tenant.company_hours,
+        instructions_specific=tenant.instructions_specific,
+    ).text
+
+    without, tokens_without = await simulate_call(instructions, turns, compaction=False)
+    with_, tokens_with = await simulate_call(instructions, turns, compaction=True)
+
+    print(f"Appel simulé de {turns} tours ({tenant.company_name})\n")
+    print(f"{'tours':<10}{'sans (ms)':>12}{'avec (ms)':>12}{'contexte sans':>16}{'contexte avec':>16}")
+    for low in range(0, turns, BUCKET):
+        high = min(low + BUCKET, turns)
+        print(
+            f"{low:>3}-{high - 1:<6}"
+            f"{statistics.median(without[low:high]) * 1000:>12.1f}"
+            f"{statistics.median(with_[low:high]) * 1000:>12.1f}"
+            f"{max(tokens_without[low:high]):>16}"
+            f"{max(tokens_with[low:high]):>16}"
+        )
+    print(f"\nContexte au dernier tour : {tokens_without[-1]} → {tokens_with[-1]} tokens (instructions comprises)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
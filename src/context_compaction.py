@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from livekit.agents import Agent, AgentSession, llm
+from livekit.agents.voice import ConversationItemAddedEvent, MetricsCollectedEvent
+
+from call_metrics import CallMetrics
+from prompt import estimate_tokens
+
+logger = logging.getLogger("agent")
+
+# Compaction du contexte des longs appels (CONTEXT_COMPACTION=0 pour désactiver)
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "1") == "1"
+COMPACT_AFTER_TURNS = int(os.getenv("COMPACT_AFTER_TURNS", "12"))  # messages appelant + agent
+COMPACT_AFTER_TOKENS = int(os.getenv("COMPACT_AFTER_TOKENS", "1500"))
+COMPACT_KEEP_LAST_TURNS = int(os.getenv("COMPACT_KEEP_LAST_TURNS", "2"))  # échanges gardés tels quels
+COMPACTION_LLM_MODEL = os.getenv("COMPACTION_LLM_MODEL", "openai/gpt-4.1-mini")
+
+SUMMARY_FIELDS = ("nom", "numero_rappel", "raison", "details", "etape")
+
+_SUMMARY_INSTRUCTIONS = (
+    "Tu résumes le début d'un appel à une réceptionniste virtuelle. Réponds UNIQUEMENT avec un objet JSON "
+    f"ayant les clés {', '.join(SUMMARY_FIELDS)} :\n"
+    "- nom : nom de l'appelant s'il l'a donné, sinon null\n"
+    "- numero_rappel : numéro de rappel confirmé, sinon null\n"
+    "- raison : raison de l'appel recueillie jusqu'ici, sinon null\n"
+    "- details : faits utiles (projet, type d'installation, personne recherchée…), en une ou deux phrases\n"
+    "- etape : où en est la prise de message (ex. « raison obtenue, reste le nom »)\n"
+    "N'invente rien."
+)
+
+
+def chat_ctx_tokens(chat_ctx: llm.ChatContext) -> int:
+    """Taille estimée du contexte (messages + appels de tools), comme le modèle la relit à chaque tour."""
+    total = 0
+    for item in chat_ctx.items:
+        if item.type == "message":
+            total += estimate_tokens(item.text_content or "")
+        elif item.type == "function_call":
+            total += estimate_tokens(item.arguments)
+        elif item.type == "function_call_output":
+            total += estimate_tokens(item.output)
+    return total
+
+
+def conversation_tokens(chat_ctx: llm.ChatContext) -> int:
+    """Taille de la conversation seule (appelant, agent, tools) : les instructions système n'en font pas partie."""
+    conversation = chat_ctx.copy()
+    conversation.items = [
+        item for item in chat_ctx.items
+        if item.type != "message" or item.role in ("user", "assistant")
+    ]
+    return chat_ctx_tokens(conversation)
+
+
+def _is_summary(item: llm.ChatItem) -> bool:
+    return item.type == "message" and bool(item.extra.get("is_summary"))
+
+
+def _conversation_messages(chat_ctx: llm.ChatContext) -> list[llm.ChatMessage]:
+    """Tours appelant/agent, y compris un résumé précédent (il est re-résumé avec le reste)."""
+    return [item for item in chat_ctx.items if item.type == "message" and item.role in ("user", "assistant")]
+
+
+def format_summary(fields: dict) -> str:
+    lines = ["[Résumé du début de l'appel – infos déjà recueillies, ne les redemande pas]"]
+    for key in SUMMARY_FIELDS:
+        value = fields.get(key)
+        if value:
+            lines.append(f"- {key} : {value}")
+    return "\n".join(lines)
+
+
+def parse_summary(text: str) -> dict:
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError(f"résumé sans JSON : {text[:80]!r}")
+    return json.loads(text[start:end + 1])
+
+
+class ContextCompactor:
+    """
+    Remplace les anciens tours d'un long appel par un résumé structuré (nom, numéro, raison…).
+    Les instructions système ne sont pas dans le contexte de conversation : elles restent intactes.
+    Le résumé est produit en tâche de fond par un petit LLM texte, hors du chemin critique des tours.
+    """
+
+    def __init__(
+            self,
+            session: AgentSession,
+            agent: Agent,
+            summarizer: llm.LLM,
+            metrics: CallMetrics,
+            max_turns: int = COMPACT_AFTER_TURNS,
+            max_tokens: int = COMPACT_AFTER_TOKENS,
+            keep_last_turns: int = COMPACT_KEEP_LAST_TURNS,
+            ) -> None:
+        self.session = session
+        self.agent = agent
+        self.summarizer = summarizer
+        self.metrics = metrics
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.keep_last_turns = keep_last_turns
+        self._task: Optional[asyncio.Task] = None
+        session.on("conversation_item_added", self._on_item_added)
+
+    def close(self) -> None:
+        self.session.off("conversation_item_added", self._on_item_added)
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def needs_compaction(self, chat_ctx: llm.ChatContext) -> bool:
+        turns = len(_conversation_messages(chat_ctx))
+        return turns > self.max_turns or conversation_tokens(chat_ctx) > self.max_tokens
+
+    def _on_item_added(self, ev: ConversationItemAddedEvent) -> None:
+        if self._task and not self._task.done():
+            return
+        if self.needs_compaction(self.agent.chat_ctx):
+            self._task = asyncio.create_task(self.compact(), name="context_compaction")
+
+    async def summarize(self, messages: list[llm.ChatMessage]) -> str:
+        transcript = "\n".join(
+            f"{'Appelant' if msg.role == 'user' else 'Agent'} : {(msg.text_content or '').strip()}" for msg in messages
+        )
+        request = llm.ChatContext()
+        request.add_message(role="system", content=_SUMMARY_INSTRUCTIONS)
+        request.add_message(role="user", content=transcript)
+
+        chunks = []
+        async with self.summarizer.chat(chat_ctx=request) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    chunks.append(chunk.delta.content)
+        return format_summary(parse_summary("".join(chunks)))
+
+    async def compact(self) -> bool:
+        started_at = time.perf_counter()
+        messages = _conversation_messages(self.agent.chat_ctx)
+        tail_n = self.keep_last_turns * 2
+        head = messages[:-tail_n] if tail_n else messages
+        if all(_is_summary(msg) for msg in head):
+            return False  # rien de neuf à résumer (vide, ou seulement le résumé précédent)
+
+        try:
+            summary = await self.summarize(head)
+        except Exception as e:
+            self.metrics.incr("compaction.failed")
+            logger.error(f"Compaction du contexte impossible : {e}")
+            return False
+
+        # Le contexte a pu grandir pendant le résumé : on repart de sa version actuelle
+        chat_ctx = self.agent.chat_ctx.copy()
+        head_ids = {msg.id for msg in head}
+        cutoff = head[-1].created_at
+        tokens_before = chat_ctx_tokens(chat_ctx)
+        chat_ctx.items = [
+            item for item in chat_ctx.items
+            if item.id not in head_ids
+            and not (item.type in ("function_call", "function_call_output") and item.created_at <= cutoff)
+        ]
+        chat_ctx.add_message(role="assistant", content=summary, created_at=cutoff, extra={"is_summary": True})
+        await self.agent.update_chat_ctx(chat_ctx)
+
+        self.metrics.incr("compaction.done")
+        self.metrics.observe("compaction.tokens_saved", tokens_before - chat_ctx_tokens(chat_ctx))
+        self.metrics.observe("compaction.duration_s", time.perf_counter() - started_at)
+        logger.info(f"Contexte compacté : {len(head)} messages → résumé ({tokens_before} → {chat_ctx_tokens(chat_ctx)} tokens)")
+        return True
+
+
+class ResponseLatencyTracker:
+    """
+    Mesure le délai avant la première réponse (TTFT) du modèle (realtime ou LLM texte) selon la longueur de l'appel,
+    par tranches de 10 tours : response.ttft_s.tours_00-09, response.ttft_s.tours_10-19, etc.
+    """
+
+    def __init__(self, session: AgentSession, metrics: CallMetrics) -> None:
+        self.session = session
+        self.metrics = metrics
+        self.turns = 0
+        session.on("conversation_item_added", self._on_item_added)
+        session.on("metrics_collected", self._on_metrics_collected)
+
+    def close(self) -> None:
+        self.session.off("conversation_item_added", self._on_item_added)
+        self.session.off("metrics_collected", self._on_metrics_collected)
+
+    def _on_item_added(self, ev: ConversationItemAddedEvent) -> None:
+        if ev.item.type == "message" and ev.item.role in ("user", "assistant"):
+            self.turns += 1
+
+    def _on_metrics_collected(self, ev: MetricsCollectedEvent) -> None:
+        if ev.metrics.type not in ("realtime_model_metrics", "llm_metrics") or ev.metrics.ttft < 0:
+            return
+        low = self.turns // 10 * 10
+        self.metrics.observe(f"response.ttft_s.tours_{low:02d}-{low + 9:02d}", ev.metrics.ttft)
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+import time
+
+from livekit.agents import AgentServer
+from livekit.agents.types import NOT_GIVEN, NotGivenOr
+
+from call_metrics import process_metrics
+from notifications import notification_aggregator
+from tenants import tenants_for_group
+
+logger = logging.getLogger("agent")
+
+# Groupe de compagnies servi par ce worker (voir TENANT_GROUPS) ; vide = toutes, sans affinité
+WORKER_TENANT_GROUP = os.getenv("WORKER_TENANT_GROUP", "")
+# Nom d'agent enregistré par groupe : les règles de dispatch SIP l'appellent explicitement
+DISPATCH_AGENT_PREFIX = "receptionniste"
+# Temps laissé aux appels en cours après SIGTERM (le délai de grâce de l'orchestrateur doit être plus long)
+DRAIN_TIMEOUT_S = int(os.getenv("DRAIN_TIMEOUT_S", "900"))
+
+
+def served_tenants(group: str = WORKER_TENANT_GROUP) -> tuple[str, ...]:
+    return tenants_for_group(group)
+
+
+def dispatch_agent_name(group: str = WORKER_TENANT_GROUP) -> str:
+    """« receptionniste-telnek » pour un worker dédié ; vide (dispatch automatique) sinon."""
+    tenants_for_group(group)  # groupe inconnu → erreur au démarrage plutôt qu'un worker qui ne reçoit rien
+    return f"{DISPATCH_AGENT_PREFIX}-{group}" if group else ""
+
+
+class DrainingAgentServer(AgentServer):
+    """
+    AgentServer qui balaye les SMS admin en attente depuis le processus principal (il vit plus
+    longtemps que les processus de job, qui ne servent qu'un appel), et dont la vidange (SIGTERM
+    en mode start) compte les appels terminés ou coupés puis envoie ce qui attend encore.
+    Le refus des nouveaux appels et l'attente des appels en cours restent ceux d'AgentServer.drain.
+    """
+
+    async def run(self, *, devmode: bool = False, unregistered: bool = False) -> None:
+        sweeper = asyncio.create_task(notification_aggregator().run_sweeper(), name="admin_sms_sweeper")
+        try:
+            await super().run(devmode=devmode, unregistered=unregistered)
+        finally:
+            sweeper.cancel()
+
+    async def drain(self, timeout: NotGivenOr[int | None] = NOT_GIVEN) -> None:
+        started_at = time.perf_counter()
+        active = len(self.active_jobs)
+        process_metrics.incr("drain.calls_at_start", active)
+        logger.info(f"Vidange du worker : plus de nouveaux appels, {active} appel(s) en cours à terminer")
+        try:
+            await super().drain(timeout)
+        except asyncio.TimeoutError:
+            dropped = len(self.active_jobs)
+            process_metrics.incr("drain.dropped_calls", dropped)
+            logger.error(f"Vidange incomplète : {dropped} appel(s) encore en cours seront coupés")
+            raise
+        finally:
+            process_metrics.observe("drain.duration_s", time.perf_counter() - started_at)
+            try:
+                process_metrics.incr("drain.sms_flushed", await notification_aggregator().drain())
+            except Exception as e:
+                logger.error(f"Erreur envoi des SMS admin en attente à l'arrêt : {e}")
+            process_metrics.log_summary(logger)
@@ -0,0 +1,201 @@
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import time
+import wave
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from livekit import rtc
+from livekit.agents import AgentSession, RunContext
+from livekit.agents.voice import SpeechHandle, UserStateChangedEvent
+
+from call_metrics import CallMetrics
+
+logger = logging.getLogger("agent")
+
+# Délai (secondes) avant de jouer un clip d'attente quand un tool tarde à répondre
+FILLER_THRESHOLD_S = float(os.getenv("FILLER_THRESHOLD_S", "1.5"))
+# Dossier des clips pré-générés : {FILLER_AUDIO_DIR}/{tenant}/*.wav (+ .txt optionnel pour le texte)
+FILLER_AUDIO_DIR = Path(os.getenv("FILLER_AUDIO_DIR", Path(__file__).resolve().parent.parent / "assets" / "filler"))
+# Fraction des attentes lentes SANS clip, pour mesurer les interruptions évitées
+FILLER_HOLDOUT = float(os.getenv("FILLER_HOLDOUT", "0.1"))
+
+DEFAULT_FILLER_TEXT = "Un instant, je vérifie…"
+FRAME_DURATION_MS = 20
+
+
+@dataclass
+class FillerClip:
+    text: str
+    frames: list[rtc.AudioFrame]
+
+
+# Cache processus : les WAV sont décodés une seule fois (au prewarm ou au premier appel)
+_clip_cache: dict[str, list[FillerClip]] = {}
+
+
+def _read_wav(path: Path) -> list[rtc.AudioFrame]:
+    """Découpe un WAV PCM 16 bits en trames de 20 ms prêtes à être jouées."""
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path.name} : seul le PCM 16 bits est supporté")
+        sample_rate = wav.getframerate()
+        num_channels = wav.getnchannels()
+        pcm = wav.readframes(wav.getnframes())
+
+    samples_per_frame = sample_rate * FRAME_DURATION_MS // 1000
+    bytes_per_frame = samples_per_frame * num_channels * 2
+    frames = []
+    for offset in range(0, len(pcm), bytes_per_frame):
+        chunk = pcm[offset:offset + bytes_per_frame]
+        frames.append(
+            rtc.AudioFrame(
+                data=chunk,
+                sample_rate=sample_rate,
+                num_channels=num_channels,
+                samples_per_channel=len(chunk) // (num_channels * 2),
+            )
+        )
+    return frames
+
+
+def load_filler_clips(tenant: str) -> list[FillerClip]:
+    """Retourne les clips d'attente d'une compagnie (voix de la compagnie), depuis le cache local."""
+    if tenant in _clip_cache:
+        return _clip_cache[tenant]
+
+    clips = []
+    tenant_dir = FILLER_AUDIO_DIR / tenant
+    for wav_path in sorted(tenant_dir.glob("*.wav")):
+        try:
+            frames = _read_wav(wav_path)
+        except (OSError, EOFError, wave.Error, ValueError) as e:
+            logger.error(f"Clip d'attente illisible {wav_path} : {e}")
+            continue
+        text_path = wav_path.with_suffix(".txt")
+        text = text_path.read_text(encoding="utf-8").strip() if text_path.exists() else DEFAULT_FILLER_TEXT
+        clips.append(FillerClip(text=text, frames=frames))
+
+    if not clips:
+        logger.warning(f"Aucun clip d'attente trouvé dans {tenant_dir}")
+    _clip_cache[tenant] = clips
+    return clips
+
+
+def preload_filler_clips(tenants: Optional[Iterable[str]] = None) -> None:
+    """À appeler dans prewarm : décode les clips des compagnies données (toutes celles sur disque par défaut)."""
+    if not FILLER_AUDIO_DIR.is_dir():
+        return
+    for tenant_dir in FILLER_AUDIO_DIR.iterdir():
+        if tenant_dir.is_dir() and (tenants is None or tenant_dir.name in tenants):
+            load_filler_clips(tenant_dir.name)
+
+
+async def _play_frames(frames: list[rtc.AudioFrame]) -> AsyncIterator[rtc.AudioFrame]:
+    for frame in frames:
+        yield frame
+
+
+@dataclass(eq=False)
+class _ToolWait:
+    tool_name: str
+    started_at: float = field(default_factory=time.perf_counter)
+    masked: bool = False
+    holdout: bool = False
+    caller_spoke: bool = False
+    handle: Optional[SpeechHandle] = None
+
+
+class ToolLatencyMasker:
+    """
+    Masque la latence des tools lents : après FILLER_THRESHOLD_S secondes sans résultat,
+    joue un court clip pré-enregistré (« Un instant, je vérifie… ») et le coupe dès que le tool termine.
+
+    Une fraction FILLER_HOLDOUT des attentes lentes ne reçoit pas de clip : comparer le taux
+    d'interruption de l'appelant (filler.caller_spoke_masked / filler.played vs
+    filler.caller_spoke_holdout / filler.holdout) donne l'effet réel du clip.
+    """
+
+    def __init__(
+            self,
+            session: AgentSession,
+            tenant: str,
+            metrics: CallMetrics,
+            threshold: float = FILLER_THRESHOLD_S,
+            holdout: float = FILLER_HOLDOUT,
+            ) -> None:
+        self.session = session
+        self.metrics = metrics
+        self.threshold = threshold
+        self.holdout = holdout
+        self._clips = load_filler_clips(tenant)
+        self._next_clip = 0
+        self._waits: set[_ToolWait] = set()
+        session.on("user_state_changed", self._on_user_state_changed)
+
+    def close(self) -> None:
+        self.session.off("user_state_changed", self._on_user_state_changed)
+
+    @contextlib.asynccontextmanager
+    async def mask(self, tool_name: str) -> AsyncIterator[None]:
+        wait = _ToolWait(tool_name)
+        self._waits.add(wait)
+        timer = asyncio.create_task(self._play_after_threshold(wait))
+        try:
+            yield
+        finally:
+            timer.cancel()
+            self._waits.discard(wait)
+            if wait.handle is not None and not wait.handle.done():
+                wait.handle.interrupt()
+                self.metrics.incr("filler.cut")
+            self.metrics.observe(f"tool.{tool_name}.latency_s", time.perf_counter() - wait.started_at)
+            if wait.caller_spoke:
+                self.metrics.incr("filler.caller_spoke_masked" if wait.masked else "filler.caller_spoke_holdout")
+
+    async def _play_after_threshold(self, wait: _ToolWait) -> None:
+        await asyncio.sleep(self.threshold)
+        self.metrics.incr("filler.slow_waits")
+
+        if not self._clips:
+            return
+        if random.random() < self.holdout:
+            wait.holdout = True
+            self.metrics.incr("filler.holdout")
+            return
+        if self.session.agent_state == "speaking":
+            # L'agent parle déjà (ex. phrase finale après take_message) : pas de clip par-dessus
+            self.metrics.incr("filler.skipped_speaking")
+            return
+
+        clip = self._clips[self._next_clip % len(self._clips)]
+        self._next_clip += 1
+        wait.handle = self.session.say(
+            clip.text,
+            audio=_play_frames(clip.frames),
+            allow_interruptions=True,
+            add_to_chat_ctx=False,
+        )
+        wait.masked = True
+        self.metrics.incr("filler.played")
+        logger.info(f"Clip d'attente joué pendant {wait.tool_name} : {clip.text}")
+
+    def _on_user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        if ev.new_state != "speaking":
+            return
+        for wait in self._waits:
+            if wait.masked or wait.holdout:
+                wait.caller_spoke = True
+
+
+def mask_tool_latency(ctx: RunContext, tool_name: str) -> contextlib.AbstractAsyncContextManager:
+    """Contexte à placer autour du travail lent d'un tool ; sans effet si le masquage n'est pas actif."""
+    masker = getattr(ctx.session.current_agent, "filler", None)
+    if masker is None:
+        return contextlib.nullcontext()
+    return masker.mask(tool_name)
@@ -0,0 +1,97 @@
+import gc
+import logging
+import os
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from call_metrics import CallMetrics
+
+logger = logging.getLogger("agent")
+
+# Mode diagnostic mémoire (coûteux : tracemalloc + gc à chaque début/fin d'appel)
+MEMORY_DIAGNOSTICS = os.getenv("MEMORY_DIAGNOSTICS", "0") == "1"
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "5"))
+MEMORY_REPORT_TOP = int(os.getenv("MEMORY_REPORT_TOP", "10"))
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def count_objects_by_type() -> Counter:
+    return Counter(type(obj).__qualname__ for obj in gc.get_objects())
+
+
+@dataclass
+class MemoryReport:
+    retained_bytes: int
+    peak_bytes: int
+    by_type: list[tuple[str, int]] = field(default_factory=list)
+    by_site: list[tuple[str, int, int]] = field(default_factory=list)  # (fichier:ligne, octets, blocs)
+
+    def log(self, scope: str) -> None:
+        logger.info(
+            f"=== MÉMOIRE {scope} === retenu: {self.retained_bytes / 1024:.1f} Kio | "
+            f"pic: {self.peak_bytes / 1024:.1f} Kio"
+        )
+        for type_name, delta in self.by_type:
+            logger.info(f"  +{delta} objets {type_name}")
+        for site, size, blocks in self.by_site:
+            logger.info(f"  +{size / 1024:.1f} Kio ({blocks:+d} blocs) {site}")
+
+
+class MemoryDiagnostics:
+    """
+    Instantanés tracemalloc/gc au début et à la fin d'un appel. Le rapport donne les octets
+    retenus et le pic de l'appel, et ce qui reste en mémoire par type d'objet et par ligne de code.
+    """
+
+    def __init__(self, top: int = MEMORY_REPORT_TOP) -> None:
+        self.top = top
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._types: Counter = Counter()
+        self._start_bytes = 0
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        gc.collect()
+        self._types = count_objects_by_type()
+        self._snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        self._start_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def finish(self, metrics: Optional[CallMetrics] = None) -> MemoryReport:
+        if self._snapshot is None:
+            raise RuntimeError("MemoryDiagnostics.finish() appelé avant start()")
+
+        peak = tracemalloc.get_traced_memory()[1]
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+        type_delta = count_objects_by_type()
+        type_delta.subtract(self._types)
+        by_type = [(name, delta) for name, delta in type_delta.most_common(self.top) if delta > 0]
+
+        growth = [stat for stat in snapshot.compare_to(self._snapshot, "lineno") if stat.size_diff > 0]
+        by_site = [
+            (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size_diff, stat.count_diff)
+            for stat in growth[: self.top]
+        ]
+
+        report = MemoryReport(
+            retained_bytes=current - self._start_bytes,
+            peak_bytes=peak - self._start_bytes,
+            by_type=by_type,
+            by_site=by_site,
+        )
+        if metrics is not None:
+            metrics.observe("memory.retained_bytes", report.retained_bytes)
+            metrics.observe("memory.peak_bytes", report.peak_bytes)
+        self._snapshot = None
+        return report
@@ -0,0 +1,213 @@
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable
+from pathlib import Path
+from typing import Callable
+
+from twilio.rest import Client
+
+from call_metrics import CallMetrics, process_metrics
+
+logger = logging.getLogger("agent")
+
+# Fenêtre de regroupement des SMS admin (secondes) ; 0 = un SMS par message comme avant
+ADMIN_SMS_WINDOW_S = float(os.getenv("ADMIN_SMS_WINDOW_S", "120"))
+NOTIFICATIONS_DB = os.getenv("NOTIFICATIONS_DB", str(Path(__file__).resolve().parent.parent / "data" / "notifications.sqlite3"))
+SWEEP_INTERVAL_S = 5.0
+# Un envoi réclamé mais jamais confirmé (crash pendant l'envoi) est repris après ce délai
+CLAIM_TIMEOUT_S = 60.0
+# Twilio concatène jusqu'à 1600 caractères ; au-delà, le résumé est coupé en plusieurs SMS
+MAX_SMS_CHARS = 1500
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS pending_sms (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        tenant      TEXT NOT NULL,
+        company     TEXT NOT NULL,
+        to_number   TEXT NOT NULL,
+        from_number TEXT NOT NULL,
+        body        TEXT NOT NULL,
+        created_at  REAL NOT NULL,
+        claimed_at  REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS pending_sms_by_tenant ON pending_sms (tenant, created_at)",
+)
+
+SmsSender = Callable[[str, str, str], Awaitable[None]]  # (to, from_, body)
+
+
+def digest_parts(company: str, bodies: list[str], max_chars: int = MAX_SMS_CHARS) -> list[tuple[str, int]]:
+    """Comme digest_bodies, avec le nombre de messages contenus dans chaque SMS."""
+    if len(bodies) == 1:
+        return [(bodies[0], 1)]
+
+    parts: list[list[str]] = []
+    current: list[str] = []
+    for index, body in enumerate(bodies, start=1):
+        entry = f"{index}) {body}"
+        if current and len("\n\n".join(current + [entry])) > max_chars:
+            parts.append(current)
+            current = []
+        current.append(entry)
+    parts.append(current)
+    header = f"📬 {len(bodies)} nouveaux messages {company}\n\n"
+    return [(header + "\n\n".join(part), len(part)) for part in parts]
+
+
+def digest_bodies(company: str, bodies: list[str], max_chars: int = MAX_SMS_CHARS) -> list[str]:
+    """Un seul message → inchangé ; plusieurs → « N nouveaux messages » numérotés, coupés à max_chars."""
+    return [body for body, _ in digest_parts(company, bodies, max_chars)]
+
+
+class NotificationAggregator:
+    """
+    Regroupe les SMS admin d'une compagnie arrivés dans la même fenêtre en un seul résumé.
+    L'état est dans SQLite (partagé entre les processus du worker, conservé au redémarrage) :
+    les appels (processus de job, un seul appel chacun) ne font que mettre en attente ; le
+    processus principal du worker balaye les fenêtres échues (run_sweeper) et envoie ce qui
+    reste à l'arrêt (drain). Des appels successifs dans une même fenêtre partagent donc un résumé.
+    """
+
+    def __init__(
+            self,
+            sender: SmsSender,
+            path: str = NOTIFICATIONS_DB,
+            window_s: float = ADMIN_SMS_WINDOW_S,
+            metrics: CallMetrics = process_metrics,
+            ) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.sender = sender
+        self.window_s = window_s
+        self.metrics = metrics
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    async def notify(
+            self,
+            tenant: str,
+            company: str,
+            to_number: str,
+            from_number: str,
+            body: str,
+            urgent: bool = False,
+            ) -> None:
+        if urgent or self.window_s <= 0:
+            self.metrics.incr("admin_sms.urgent" if urgent else "admin_sms.immediate")
+            await self.sender(to_number, from_number, body)
+            self.metrics.incr("admin_sms.sent")
+            return
+
+        await asyncio.to_thread(self._queue, tenant, company, to_number, from_number, body)
+        self.metrics.incr("admin_sms.queued")
+        logger.info(f"SMS admin {company} mis en attente (fenêtre de {self.window_s:.0f} s)")
+
+    # Accès SQLite bloquants (verrou, busy timeout de 5 s) : appelés via asyncio.to_thread hors de la boucle audio
+
+    def _queue(self, tenant: str, company: str, to_number: str, from_number: str, body: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending_sms (tenant, company, to_number, from_number, body, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (tenant, company, to_number, from_number, body, time.time()),
+            )
+
+    def _release(self, ids: list[int], sent: bool) -> None:
+        """Envoyés → supprimés ; sinon remis en attente pour le prochain balayage."""
+        statement = "DELETE FROM pending_sms WHERE id = ?" if sent else "UPDATE pending_sms SET claimed_at = NULL WHERE id = ?"
+        with self._lock:
+            self._conn.executemany(statement, [(id_,) for id_ in ids])
+
+    def _claim(self, due_only: bool) -> list[tuple]:
+        """Réserve (transaction IMMEDIATE) les messages à envoyer, pour qu'un seul processus les envoie."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, tenant, company, to_number, from_number, body FROM pending_sms "
+                    "WHERE (claimed_at IS NULL OR claimed_at < ?) "
+                    "AND (? OR tenant IN (SELECT tenant FROM pending_sms WHERE claimed_at IS NULL OR claimed_at < ? "
+                    "GROUP BY tenant HAVING MIN(created_at) <= ?)) "
+                    "ORDER BY created_at",
+                    (now - CLAIM_TIMEOUT_S, not due_only, now - CLAIM_TIMEOUT_S, now - self.window_s),
+                ).fetchall()
+                self._conn.executemany("UPDATE pending_sms SET claimed_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    async def flush(self, due_only: bool = True) -> int:
+        """Envoie les résumés des fenêtres échues (ou tout, si due_only=False). Retourne le nombre de SMS envoyés."""
+        groups: dict[tuple[str, str, str, str], list[tuple]] = {}
+        for row in await asyncio.to_thread(self._claim, due_only):
+            _, tenant, company, to_number, from_number, _ = row
+            groups.setdefault((tenant, company, to_number, from_number), []).append(row)
+
+        sent = 0
+        for (_, company, to_number, from_number), rows in groups.items():
+            ids = [row[0] for row in rows]
+            done = 0
+            try:
+                # Chaque SMS envoyé libère ses messages : un échec sur une partie suivante ne renvoie pas les premières
+                for body, count in digest_parts(company, [row[5] for row in rows]):
+                    await self.sender(to_number, from_number, body)
+                    await asyncio.to_thread(self._release, ids[done:done + count], True)
+                    done += count
+                    sent += 1
+                    self.metrics.incr("admin_sms.sent")
+            except Exception as e:
+                logger.error(f"Erreur envoi résumé SMS {company} : {e} → {len(ids) - done} message(s) remis en attente")
+                await asyncio.to_thread(self._release, ids[done:], False)
+                continue
+            finally:
+                self.metrics.incr("admin_sms.coalesced", done)
+            logger.info(f"Résumé SMS {company} envoyé : {len(rows)} message(s)")
+        return sent
+
+    async def run_sweeper(self, interval_s: float = SWEEP_INTERVAL_S) -> None:
+        """Tâche du processus principal du worker : envoie les fenêtres échues (toutes compagnies)."""
+        while True:
+            try:
+                await self.flush(due_only=True)
+            except sqlite3.Error as e:
+                logger.error(f"Erreur balayage des SMS en attente : {e}")
+            await asyncio.sleep(interval_s)
+
+    async def drain(self) -> int:
+        """Arrêt du worker (après ses appels) : envoie tout ce qui attend sans attendre la fin des fenêtres."""
+        return await self.flush(due_only=False)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@functools.cache
+def twilio_client() -> Client:
+    """Un seul client Twilio par processus (et sa session HTTP), réutilisé d'un appel à l'autre."""
+    return Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+
+
+async def send_sms(to_number: str, from_number: str, body: str) -> None:
+    # Le client Twilio est bloquant → appel dans un thread pour ne pas geler l'audio
+    message = await asyncio.to_thread(twilio_client().messages.create, to=to_number, from_=from_number, body=body)
+    logger.info(f"SMS envoyé avec succès (SID: {message.sid}) à {to_number}")
+
+
+@functools.cache
+def notification_aggregator() -> NotificationAggregator:
+    """Agrégateur partagé par tous les appels du processus (ouvert au prewarm)."""
+    return NotificationAggregator(send_sms)
@@ -0,0 +1,239 @@
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger("agent")
+
+# Budget (tokens estimés) des instructions système envoyées à chaque début de session realtime
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1800"))
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimation du nombre de tokens sans tokenizer : ~1,3 token par mot français
+    (accents, élisions) plus un token par ponctuation.
+    """
+    words = punctuation = 0
+    for match in _TOKEN_RE.finditer(text):
+        if match.group()[0].isalnum() or match.group()[0] == "_":
+            words += 1
+        else:
+            punctuation += 1
+    return round(words * 1.3) + punctuation
+
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    required: bool = True  # les sections optionnelles sont retirées en premier si le budget est dépassé
+
+
+@dataclass
+class CompiledPrompt:
+    text: str
+    tokens: int
+    budget: int
+    sections: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+    duplicate_lines: int = 0
+
+    @property
+    def over_budget(self) -> bool:
+        return self.tokens > self.budget
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.lstrip("-• ").lower().split())
+
+
+def dedupe_sections(sections: list[PromptSection]) -> tuple[list[PromptSection], int]:
+    """Retire les lignes déjà dites dans une section précédente (ex. règle répétée dans les instructions d'une compagnie)."""
+    seen: set[str] = set()
+    removed = 0
+    result = []
+    for section in sections:
+        lines = []
+        for line in section.text.splitlines():
+            key = _normalize(line)
+            if key and key in seen:
+                removed += 1
+                continue
+            if key:
+                seen.add(key)
+            lines.append(line)
+        text = "\n".join(lines).strip("\n")
+        if text:
+            result.append(PromptSection(section.name, text + "\n", section.required))
+    return result, removed
+
+
+def base_sections(
+        agent_name: str,
+        company_name: str,
+        company_address: str,
+        company_hours: str,
+        caller_number: Optional[str] = None,
+        spoken_caller: str = "inconnue",
+        instructions_specific: str = "",
+        caller_name: Optional[str] = None,
+        spoken_callback: Optional[str] = None,
+        ) -> list[PromptSection]:
+    """Chaque règle n'apparaît qu'une fois ; l'ordre suit le déroulement d'un appel."""
+    # appelant connu : son nom et son numéro de rappel sont dans appelant_connu, on ne les redemande pas
+    callback_rules = "" if spoken_callback else (
+        "- Propose d'abord d'utiliser le numéro actuel pour le rappel : « Je peux utiliser le numéro d'où vous appelez, qui est le [numéro formaté lentement], ou préférez-vous m'en donner un autre ? »\n"
+        "- Si l'appelant confirme le numéro actuel ou en donne un autre, note-le sans répéter inutilement.\n"
+    )
+    name_rule = "" if caller_name else "- Demande le nom complet seulement quand c'est nécessaire.\n"
+    sections = [
+        PromptSection("identite", (
+            f"Tu es {agent_name}, une réceptionniste virtuelle TRÈS chaleureuse, professionnelle et efficace pour la compagnie {company_name}.\n"
+            "Imagine que tu souris largement en parlant — rends ta voix encore plus accueillante, sympathique et réconfortante.\n"
+            "Tu parles en français québécois courant et poli, avec un ton naturel comme une vraie personne au téléphone au Québec.\n"
+            "Tes réponses doivent être courtes et naturelles : maximum 2-3 phrases à la fois. Parle à un rythme détendu, avec des pauses naturelles.\n"
+            "Utilise des contractions courantes (« j’peux », « c’est », « y’a », « j’vas », « laissez-moi »), mais RESTE TOUJOURS POLIE ET PROFESSIONNELLE.\n"
+            "Évite ABSOLUMENT les expressions trop familières comme « bein », « chu », « moé », « toé ». Dis toujours « bien », « je suis », « moi », « vous ».\n"
+            "Toujours vouvoyer l’appelant : utilise « vous », « laissez-moi », « pourriez-vous », etc. Jamais de tutoiement.\n"
+            "Tu peux poursuivre en anglais si l’appelant est clairement anglophone.\n"
+            "Reste toujours dans ton rôle. Ne mentionne jamais que tu es une IA.\n"
+        )),
+        PromptSection("une_question", (
+            "CRUCIAL : Tu DOIS TOUJOURS poser UNE SEULE question ou demande à la fois, puis attendre la réponse complète avant de passer à la suivante.\n"
+            "Exemple à ÉVITER : « Quel est votre nom et quel est le sujet ? »\n"
+            "Progresse calmement, étape par étape, sans jamais regrouper ou anticiper.\n"
+        )),
+        PromptSection("accueil", (
+            f"Quand l'appel commence, salue comme ça : « {greeting(company_name, agent_name, caller_name)} »\n"
+        )),
+        PromptSection("prise_message", (
+            "Prise de message ou rendez-vous :\n"
+            "- Commence par demander la personne recherchée ou le département.\n"
+            "- Ensuite, demande le sujet ou la raison de l'appel.\n"
+            f"{callback_rules}{name_rule}"
+            "- Une fois toutes les infos recueillies, répète UNE SEULE FOIS pour confirmation : « Juste pour confirmer : [nom], [numéro], [message/sujet]. C’est bien ça ? »\n"
+            "- CRUCIAL : Tu NE DOIS JAMAIS appeler le tool take_message avant une confirmation EXPLICITE de l’appelant APRÈS le récapitulatif (ex. « oui », « c’est correct », « parfait », « c’est ça »). Même si tout semble complet, attends la réponse verbale en silence.\n"
+            "- Si l’appelant ne confirme pas ou corrige → tu ajustes sans appeler le tool.\n"
+            "- Une fois confirmé, appelle le tool take_message avec les paramètres exacts (name, callback_number, reason).\n"
+            "- Mets urgent=true seulement si l'appelant dit clairement que c'est urgent (panne, danger, urgence).\n"
+            "- CRUCIAL : Après avoir appelé take_message, dis IMMÉDIATEMENT sans attendre le résultat cette phrase finale : « Parfait, je transmets votre message dès que possible. Merci d'avoir appelé ! Passez une belle journée ! Au revoir ! »\n"
+            "- IMMÉDIATEMENT après avoir fini de dire cette phrase (et seulement après), appelle le tool end_call. Ne dis RIEN d'autre, ne pose plus de question.\n"
+        )),
+        PromptSection("infos_generales", (
+            "Demande d'informations générales (heures, adresse, service offert etc.) :\n"
+            "- Réponds brièvement et chaleureusement.\n"
+            "- Ensuite, demande : « Est-ce que je peux vous aider avec autre chose ? »\n"
+            "- Si l'appelant dit non ou reste silencieux (5-10 secondes), conclus avec : « Merci d'avoir appelé ! Passez une belle journée ! Au revoir ! » puis appelle IMMÉDIATEMENT end_call.\n"
+            "- Si silence prolongé (>20 secondes), conclus poliment et appelle end_call.\n"
+        )),
+        PromptSection("telephone", (
+            "Quand tu dis un numéro de téléphone, prononce-le lentement, chiffre par chiffre, groupe par 3-3-4 à la québécoise, avec une pause d’environ 1 seconde entre les groupes :\n"
+            "- Ex. (450) 808-0813 → « quatre cinq zéro... huit zéro huit... zéro huit un trois. »\n"
+            "- Prononce le 't' final de « huit ». Jamais de style européen comme « quatre-vingt », jamais en continu ni en format international (+1…).\n"
+        )),
+        PromptSection("compagnie", (
+            f"Nos bureaux sont ouverts du {company_hours}.\n"
+            f"L'adresse de nos bureau est le {company_address}.\n"
+        )),
+        PromptSection("outils", (
+            "Quand l'appelant demande l'heure, la date ou le jour, utilise IMMÉDIATEMENT la tool get_current_datetime ou get_current_time.\n"
+            f"Pour des infos détaillées qui pourraient être sur le site web de {company_name} (services, tarifs, équipe, coordonnées complètes, promotions, etc.), "
+            "utilise IMMÉDIATEMENT fetch_company_website avec la section la plus pertinente ('accueil', 'services', 'contact', 'apropos', 'equipe') "
+            f"et, si tu cherches quelque chose de précis, passe-le dans 'query'. Ne l'utilise QUE pour {company_name}, "
+            "puis résume les infos de façon naturelle, concise et chaleureuse.\n"
+        )),
+    ]
+
+    # appelant déjà connu (historique) : pas besoin de redemander le nom ni le numéro
+    if caller_name:
+        callback_question = f"Pour le rappel, demande seulement : « Est-ce qu'on vous rappelle au même numéro, le {spoken_callback} ? »\n" if spoken_callback else ""
+        sections.append(PromptSection("appelant_connu", (
+            f"Information importante : cet appelant a déjà laissé un message sous le nom {caller_name}. Ne redemande pas son nom, "
+            "sauf s'il dit être quelqu'un d'autre.\n"
+            f"{callback_question}"
+        )))
+    # numéro de l'appelant est connue (et pas de numéro de rappel mémorisé prononçable)
+    if caller_number and not spoken_callback:
+        sections.append(PromptSection("numero_appelant", (
+            f"Information importante : l'appelant utilise actuellement le numéro de téléphone {caller_number}.\n"
+            f"Pour le rappel, propose-le avec CETTE phrase EXACTE : « Je peux utiliser le numéro d'où vous appelez, qui est le {spoken_caller}, ou préférez-vous m'en donner un autre ? »\n"
+        )))
+
+    # ajout des instructions spécifiques pour cette compagnie
+    if instructions_specific:
+        sections.append(PromptSection("specifique", instructions_specific))
+
+    sections.append(PromptSection("resume", (
+        "RÉSUMÉ DES RÈGLES ABSOLUES : une seule question à la fois ; confirmation EXPLICITE avant take_message ; "
+        "phrase finale toujours complète, immédiate et chaleureuse ; ton québécois poli (jamais trop familier).\n"
+    ), required=False))
+    return sections
+
+
+def greeting(company_name: str, agent_name: str, caller_name: Optional[str] = None) -> str:
+    hello = f"Bonjour {caller_name}" if caller_name else "Bonjour"
+    return f"{hello}, vous êtes bien chez {company_name}, mon nom est {agent_name}. Comment puis-je vous aider aujourd’hui ?"
+
+
+def assemble_prompt(sections: list[PromptSection], budget: int = PROMPT_TOKEN_BUDGET) -> CompiledPrompt:
+    """Dédoublonne, mesure, puis retire les sections optionnelles (de la fin) tant que le budget est dépassé."""
+    sections, duplicate_lines = dedupe_sections(sections)
+    dropped = []
+
+    def render(parts: list[PromptSection]) -> str:
+        return "\n".join(section.text for section in parts)
+
+    text = render(sections)
+    while estimate_tokens(text) > budget:
+        optional = [section for section in sections if not section.required]
+        if not optional:
+            break
+        sections.remove(optional[-1])
+        dropped.append(optional[-1].name)
+        text = render(sections)
+
+    compiled = CompiledPrompt(
+        text=text,
+        tokens=estimate_tokens(text),
+        budget=budget,
+        sections=[section.name for section in sections],
+        dropped=dropped,
+        duplicate_lines=duplicate_lines,
+    )
+    if compiled.dropped:
+        logger.warning(f"Budget du prompt dépassé : sections retirées {compiled.dropped}")
+    if compiled.over_budget:
+        logger.error(f"Prompt de {compiled.tokens} tokens > budget de {budget} même sans les sections optionnelles")
+    return compiled
+
+
+def build_instructions(
+        agent_name: str,
+        company_name: str,
+        company_address: str,
+        company_hours: str,
+        caller_number: Optional[str] = None,
+        spoken_caller: str = "inconnue",
+        instructions_specific: str = "",
+        caller_name: Optional[str] = None,
+        spoken_callback: Optional[str] = None,
+        budget: int = PROMPT_TOKEN_BUDGET,
+        ) -> CompiledPrompt:
+    return assemble_prompt(
+        base_sections(
+            agent_name,
+            company_name,
+            company_address,
+            company_hours,
+            caller_number=caller_number,
+            spoken_caller=spoken_caller,
+            instructions_specific=instructions_specific,
+            caller_name=caller_name,
+            spoken_callback=spoken_callback,
+        ),
+        budget=budget,
+    )
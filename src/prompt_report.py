@@ -0,0 +1,71 @@
+"""
+Vérification hors ligne des instructions système, par compagnie :
+taille estimée vs PROMPT_TOKEN_BUDGET, et temps de mise en place d'une session
+(start + premier tour) avec le modèle de remplacement selon la taille du prompt.
+
+    uv run python src/prompt_report.py
+
+Retourne 1 si une compagnie dépasse son budget (utilisable en CI).
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from livekit.agents import Agent, AgentSession
+
+from prompt import PROMPT_TOKEN_BUDGET, build_instructions, estimate_tokens
+from stand_in_llm import StandInLLM
+from tenants import TENANTS
+
+agent_name = os.getenv("AGENT_NAME", "Amélie")
+SAMPLE_CALLER = "+15145550123"
+SAMPLE_SPOKEN_CALLER = "cinq un quatre... cinq cinq cinq... zéro un deux trois"
+SIZE_FACTORS = (0.5, 1, 2, 4)
+
+
+async def measure_session_setup(instructions: str, runs: int = 5) -> float:
+    """Médiane (secondes) de session.start + premier tour de réponse avec StandInLLM."""
+    timings = []
+    for _ in range(runs):
+        async with StandInLLM() as stand_in, AgentSession(llm=stand_in) as session:
+            started_at = time.perf_counter()
+            await session.start(Agent(instructions=instructions))
+            await session.run(user_input="Bonjour")
+            timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+async def main() -> int:
+    over_budget = False
+    print(f"Budget : {PROMPT_TOKEN_BUDGET} tokens\n")
+    print(f"{'compagnie':<14}{'tokens':>8}{'doublons':>10}{'setup (ms)':>12}  sections retirées")
+    for tenant in TENANTS.values():
+        compiled = build_instructions(
+            agent_name,
+            tenant.company_name,
+            tenant.company_address,
+            tenant.company_hours,
+            caller_number=SAMPLE_CALLER,
+            spoken_caller=SAMPLE_SPOKEN_CALLER,
+            instructions_specific=tenant.instructions_specific,
+        )
+        setup_s = await measure_session_setup(compiled.text)
+        status = "  ⚠ HORS BUDGET" if compiled.over_budget else ""
+        print(f"{tenant.key:<14}{compiled.tokens:>8}{compiled.duplicate_lines:>10}{setup_s * 1000:>12.1f}  {compiled.dropped or '-'}{status}")
+        over_budget |= compiled.over_budget
+
+    # Effet de la taille seule : même prompt, réduit ou répété
+    reference = build_instructions(agent_name, "Telnek", "", "").text
+    print(f"\n{'taille':<8}{'tokens':>8}{'setup (ms)':>12}")
+    for factor in SIZE_FACTORS:
+        text = reference[: int(len(reference) * factor)] if factor < 1 else reference * int(factor)
+        setup_s = await measure_session_setup(text)
+        print(f"x{factor:<7}{estimate_tokens(text):>8}{setup_s * 1000:>12.1f}")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,92 @@
+"""
+Pré-génère les clips d'attente (« Un instant, je vérifie… ») de chaque compagnie, dans la voix
+de l'agent (modèle realtime xAI, même voix que my_agent), vers FILLER_AUDIO_DIR/<compagnie>/.
+
+    uv run python src/render_filler_clips.py
+    uv run python src/render_filler_clips.py --tenant electrizone --force
+
+Chaque clip est un WAV PCM 16 bits + un .txt avec le texte prononcé (transcript).
+Demande XAI_API_KEY (dans .env.local comme pour l'agent). Les clips existants sont gardés sauf avec --force.
+"""
+import argparse
+import asyncio
+import sys
+import wave
+
+import aiohttp
+from dotenv import load_dotenv
+from livekit import rtc
+from livekit.plugins import xai
+
+from filler import DEFAULT_FILLER_TEXT, FILLER_AUDIO_DIR
+from tenants import TENANTS
+
+AGENT_VOICE = "ara"  # voix du RealtimeModel de my_agent
+FILLER_TEXTS = (
+    DEFAULT_FILLER_TEXT,
+    "Un petit instant, je regarde ça…",
+    "Je vérifie tout de suite, un instant…",
+)
+INSTRUCTIONS = (
+    "Tu es Amélie, réceptionniste québécoise. Tu lis exactement le texte demandé, sans rien ajouter, "
+    "d'une voix calme et chaleureuse, comme au téléphone pendant que tu cherches une information."
+)
+
+
+async def render(model: xai.realtime.RealtimeModel, text: str) -> rtc.AudioFrame:
+    """Une réponse du modèle realtime limitée au texte donné ; retourne l'audio complet."""
+    realtime = model.session()
+    try:
+        await realtime.update_instructions(INSTRUCTIONS)
+        generation = await realtime.generate_reply(instructions=f"Dis exactement : « {text} »")
+        frames = []
+        async for message in generation.message_stream:
+            async for frame in message.audio_stream:
+                frames.append(frame)
+    finally:
+        await realtime.aclose()
+    if not frames:
+        raise RuntimeError(f"aucun audio reçu pour « {text} »")
+    return rtc.combine_audio_frames(frames)
+
+
+def write_clip(frame: rtc.AudioFrame, text: str, wav_path) -> None:
+    wav_path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(wav_path), "wb") as wav:
+        wav.setnchannels(frame.num_channels)
+        wav.setsampwidth(2)
+        wav.setframerate(frame.sample_rate)
+        wav.writeframes(frame.data.tobytes())
+    wav_path.with_suffix(".txt").write_text(text + "\n", encoding="utf-8")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Pré-génère les clips d'attente dans la voix de l'agent")
+    parser.add_argument("--tenant", choices=sorted(TENANTS), action="append", help="compagnie (toutes par défaut)")
+    parser.add_argument("--voice", default=AGENT_VOICE)
+    parser.add_argument("--force", action="store_true", help="régénère les clips déjà présents")
+    args = parser.parse_args()
+
+    load_dotenv(".env.local")
+    failed = False
+    async with aiohttp.ClientSession() as http_session:
+        model = xai.realtime.RealtimeModel(voice=args.voice, http_session=http_session)
+        for tenant in args.tenant or TENANTS:
+            for index, text in enumerate(FILLER_TEXTS, start=1):
+                wav_path = FILLER_AUDIO_DIR / tenant / f"attente_{index:02d}.wav"
+                if wav_path.exists() and not args.force:
+                    print(f"{wav_path} : déjà présent")
+                    continue
+                try:
+                    frame = await render(model, text)
+                except Exception as e:
+                    print(f"{wav_path} : ÉCHEC {e}", file=sys.stderr)
+                    failed = True
+                    continue
+                write_clip(frame, text, wav_path)
+                print(f"{wav_path} : {frame.duration:.1f} s « {text} »")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
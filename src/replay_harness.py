@@ -0,0 +1,482 @@
+"""
+Banc de rejeu hors ligne du tour de parole : des enregistrements d'appelants (WAV 8 kHz mono)
+passent en temps réel dans la même chaîne d'entrée que my_agent (AudioStream 24 kHz / 50 ms
+comme room_io, VAD Silero, preemptive_generation) avec des modèles de remplacement, et le délai
+entre la fin de la parole de l'appelant et le début de la réponse est mesuré à chaque tour.
+
+    uv run python src/replay_harness.py appels/*.wav --min-silence 0.3 0.55 --preemptive on off
+
+Chaque combinaison de réglages est rejouée sur chaque fichier, puis comparée dans un tableau final.
+Un fichier texte à côté du WAV (même nom, .txt) donne les transcriptions de l'appelant, une ligne
+par segment de parole ; sans lui, une phrase générique est utilisée.
+
+La réduction de bruit BVC de LiveKit ne s'applique qu'à une piste reliée à une room : hors ligne,
+--noise-suppression utilise à la place le module WebRTC (APM) de livekit.rtc.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+import wave
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import Agent, AgentSession, APIConnectOptions, stt, tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+from livekit.agents.voice import UserStateChangedEvent, io
+from livekit.plugins import silero
+
+from prompt import build_instructions
+from stand_in_llm import StandInLLM
+from tenants import TENANTS
+
+agent_name = os.getenv("AGENT_NAME", "Amélie")
+
+# Mêmes réglages que room_io.AudioInputOptions par défaut
+INPUT_SAMPLE_RATE = 24000
+INPUT_FRAME_MS = 50
+# Silence ajouté après l'enregistrement pour laisser le VAD conclure le dernier tour
+TRAILING_SILENCE_S = 3.0
+# Vérité terrain de la fin de parole, indépendante des réglages du VAD testés
+SPEECH_DBFS = -35.0
+MIN_VOICED_S = 0.06
+BRIDGE_GAP_S = 0.25
+
+DEFAULT_TRANSCRIPT = "Oui, c'est pour laisser un message."
+AGENT_REPLIES = (
+    "Parfait, je note. Pourriez-vous me donner votre nom, s'il vous plaît ?",
+    "Merci ! Est-ce que je peux utiliser le numéro d'où vous appelez ?",
+)
+
+
+def read_wav(path: Path) -> tuple[np.ndarray, int]:
+    """Échantillons int16 mono et fréquence d'échantillonnage (8 kHz pour la téléphonie)."""
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path} : PCM 16 bits attendu")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        if wav.getnchannels() > 1:
+            samples = samples.reshape(-1, wav.getnchannels())[:, 0].copy()  # canal de l'appelant
+        return samples, wav.getframerate()
+
+
+def speech_segments(
+        samples: np.ndarray,
+        sample_rate: int,
+        threshold_dbfs: float = SPEECH_DBFS,
+        min_voiced_s: float = MIN_VOICED_S,
+        bridge_gap_s: float = BRIDGE_GAP_S,
+        ) -> list[tuple[float, float]]:
+    """Segments (début, fin) en secondes où l'énergie dépasse le seuil, par fenêtres de 20 ms."""
+    window = sample_rate // 50
+    segments: list[list[float]] = []
+    for index in range(len(samples) // window):
+        chunk = samples[index * window:(index + 1) * window].astype(np.float64)
+        rms = np.sqrt(np.mean(chunk ** 2)) or 1e-9
+        if 20 * np.log10(rms / 32768) < threshold_dbfs:
+            continue
+        start, end = index / 50, (index + 1) / 50
+        if segments and start - segments[-1][1] <= bridge_gap_s:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+    return [(start, end) for start, end in segments if end - start >= min_voiced_s]
+
+
+@dataclass
+class TurnTiming:
+    caller_end_s: float  # fin de parole de l'appelant (énergie), depuis le début de l'appel
+    reply_s: float  # fin de parole → début de la réponse audio
+    vad_s: Optional[float] = None  # fin de parole → fin de parole selon le VAD
+    transcript_s: Optional[float] = None  # fin de parole → transcription finale
+
+
+def match_turns(
+        segments: list[tuple[float, float]],
+        playback_starts: list[float],
+        vad_ends: list[float],
+        transcripts: list[float],
+        ) -> list[TurnTiming]:
+    """Associe chaque début de réponse à la dernière fin de parole de l'appelant qui la précède."""
+    turns = []
+    last_end = None
+    for started in playback_starts:
+        ends = [end for _, end in segments if end <= started]
+        if not ends or ends[-1] == last_end:
+            continue  # réponse sans nouvelle parole de l'appelant (accueil, suite d'un tool)
+        last_end = ends[-1]
+        vad_end = next((t for t in vad_ends if last_end <= t <= started), None)
+        transcript = next((t for t in transcripts if last_end <= t <= started), None)
+        turns.append(TurnTiming(
+            caller_end_s=last_end,
+            reply_s=started - last_end,
+            vad_s=vad_end - last_end if vad_end is not None else None,
+            transcript_s=transcript - last_end if transcript is not None else None,
+        ))
+    return turns
+
+
+class ScriptedSTT(stt.STT):
+    """
+    STT de remplacement en streaming, comme Deepgram avec son endpointing : la transcription finale
+    de chaque segment de parole arrive latency_s après sa fin (vérité terrain par l'énergie, dans
+    l'audio reçu), souvent avant que le VAD ne conclue. C'est ce qui laisse preemptive_generation
+    démarrer la réponse pendant min_silence_duration.
+    """
+
+    def __init__(self, transcripts: list[str], speech_ends: list[float], latency_s: float = 0.2) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=False))
+        self._transcripts = iter(transcripts)
+        self.speech_ends = speech_ends
+        self.latency_s = latency_s
+
+    def next_event(self) -> stt.SpeechEvent:
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            alternatives=[stt.SpeechData(language="fr-CA", text=next(self._transcripts, DEFAULT_TRANSCRIPT))],
+        )
+
+    async def _recognize_impl(
+            self,
+            buffer,
+            *,
+            language: NotGivenOr[str] = NOT_GIVEN,
+            conn_options: APIConnectOptions,
+            ) -> stt.SpeechEvent:
+        await asyncio.sleep(self.latency_s)
+        return self.next_event()
+
+    def stream(
+            self,
+            *,
+            language: NotGivenOr[str] = NOT_GIVEN,
+            conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+            ) -> "ScriptedRecognizeStream":
+        return ScriptedRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class ScriptedRecognizeStream(stt.RecognizeStream):
+    """Suit la position dans l'audio reçu ; chaque fin de segment dépassée programme sa transcription finale."""
+
+    async def _run(self) -> None:
+        scripted: ScriptedSTT = self._stt  # type: ignore[assignment]
+        pending = list(scripted.speech_ends)
+        position_s = 0.0
+        finals: list[asyncio.Task] = []
+        try:
+            async for frame in self._input_ch:
+                if isinstance(frame, self._FlushSentinel):
+                    continue
+                position_s += frame.duration
+                while pending and pending[0] <= position_s:
+                    late_s = position_s - pending.pop(0)  # granularité des trames (50 ms)
+                    finals.append(asyncio.create_task(self._emit_final(scripted, max(0.0, scripted.latency_s - late_s))))
+            await asyncio.gather(*finals)
+        finally:
+            for task in finals:
+                task.cancel()
+
+    async def _emit_final(self, scripted: ScriptedSTT, delay_s: float) -> None:
+        await asyncio.sleep(delay_s)
+        self._event_ch.send_nowait(scripted.next_event())
+
+
+class StandInTTS(tts.TTS):
+    """TTS de remplacement : du silence, d'une durée proportionnelle au texte, après un délai fixe."""
+
+    def __init__(self, ttfb_s: float = 0.15, chars_per_s: float = 14.0) -> None:
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=INPUT_SAMPLE_RATE, num_channels=1)
+        self.ttfb_s = ttfb_s
+        self.chars_per_s = chars_per_s
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "StandInChunkedStream":
+        return StandInChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class StandInChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        stand_in: StandInTTS = self._tts  # type: ignore[assignment]
+        await asyncio.sleep(stand_in.ttfb_s)
+        output_emitter.initialize(
+            request_id=str(uuid.uuid4()),
+            sample_rate=stand_in.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        duration_s = max(0.5, len(self._input_text) / stand_in.chars_per_s)
+        output_emitter.push(bytes(int(duration_s * stand_in.sample_rate) * 2))
+        output_emitter.flush()
+
+
+class ReplayAudioInput(io.AudioInput):
+    """
+    Rejoue un WAV en temps réel par paquets de 10 ms dans une piste locale, lue par le même
+    rtc.AudioStream que room_io (rééchantillonnage 24 kHz, trames de 50 ms).
+    """
+
+    def __init__(self, samples: np.ndarray, sample_rate: int, noise_suppression: bool = False) -> None:
+        super().__init__(label="Replay")
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.finished = asyncio.Event()
+        self._source = rtc.AudioSource(sample_rate, 1)
+        track = rtc.LocalAudioTrack.create_audio_track("appelant", self._source)
+        self._stream = rtc.AudioStream.from_track(
+            track=track,
+            sample_rate=INPUT_SAMPLE_RATE,
+            num_channels=1,
+            frame_size_ms=INPUT_FRAME_MS,
+        )
+        self._apm = rtc.AudioProcessingModule(noise_suppression=True, high_pass_filter=True) if noise_suppression else None
+        self._task: Optional[asyncio.Task] = None
+
+    def play(self, started_at: float) -> None:
+        self._task = asyncio.create_task(self._play(started_at), name="replay_audio")
+
+    async def _play(self, started_at: float) -> None:
+        chunk = self.sample_rate // 100
+        padded = np.concatenate([self.samples, np.zeros(int(TRAILING_SILENCE_S * self.sample_rate), dtype=np.int16)])
+        for index in range(len(padded) // chunk):
+            delay = started_at + index * 0.01 - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            frame = rtc.AudioFrame(padded[index * chunk:(index + 1) * chunk].tobytes(), self.sample_rate, 1, chunk)
+            if self._apm:
+                self._apm.process_stream(frame)
+            await self._source.capture_frame(frame)
+        self.finished.set()
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        event = await self._stream.__anext__()
+        return event.frame
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+        await self._stream.aclose()
+        await self._source.aclose()
+
+
+class ReplayAudioOutput(io.AudioOutput):
+    """
+    Sortie sans haut-parleur : simule la durée de lecture (avec pause, comme la sortie room_io,
+    pour les fausses interruptions) et note le début de chaque réponse.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(label="Replay", capabilities=io.AudioOutputCapabilities(pause=True))
+        self.playback_starts: list[float] = []  # time.monotonic()
+        self.interruptions = 0
+        self._started_at: Optional[float] = None
+        self._pushed_s = 0.0
+        self._paused_at: Optional[float] = None
+        self._paused_s = 0.0
+        self._flushed = False
+        self._playout: Optional[asyncio.Task] = None
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+            self.playback_starts.append(self._started_at)
+            self.on_playback_started(created_at=time.time())
+        self._pushed_s += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if self._started_at is not None:
+            self._flushed = True
+            self._schedule_playout()
+
+    def clear_buffer(self) -> None:
+        if self._playout:
+            self._playout.cancel()
+        if self._started_at is not None:
+            self.interruptions += 1
+            self._finish(interrupted=True)
+
+    def pause(self) -> None:
+        super().pause()
+        if self._paused_at is None:
+            self._paused_at = time.monotonic()
+            if self._playout:
+                self._playout.cancel()
+
+    def resume(self) -> None:
+        super().resume()
+        if self._paused_at is not None:
+            self._paused_s += time.monotonic() - self._paused_at
+            self._paused_at = None
+            if self._flushed and self._started_at is not None:
+                self._schedule_playout()
+
+    def _schedule_playout(self) -> None:
+        if self._paused_at is None:
+            ends_at = self._started_at + self._paused_s + self._pushed_s
+            self._playout = asyncio.create_task(self._wait_for_playout(ends_at))
+
+    async def _wait_for_playout(self, ends_at: float) -> None:
+        await asyncio.sleep(max(0.0, ends_at - time.monotonic()))
+        self._finish(interrupted=False)
+
+    def _finish(self, interrupted: bool) -> None:
+        now = self._paused_at or time.monotonic()
+        position = min(self._pushed_s, now - self._started_at - self._paused_s)
+        self._started_at, self._pushed_s, self._playout = None, 0.0, None
+        self._paused_at, self._paused_s, self._flushed = None, 0.0, False
+        self.on_playback_finished(playback_position=position, interrupted=interrupted)
+
+
+@dataclass
+class ReplaySettings:
+    min_silence_s: float
+    activation_threshold: float
+    preemptive: bool
+    noise_suppression: bool = False
+    stt_latency_s: float = 0.2
+    llm_latency_s: float = 0.6
+
+    def label(self) -> str:
+        return (
+            f"silence={self.min_silence_s:.2f} seuil={self.activation_threshold:.2f} "
+            f"preemptive={'on' if self.preemptive else 'off'}{' apm' if self.noise_suppression else ''}"
+        )
+
+
+@dataclass
+class ReplayResult:
+    path: str
+    settings: ReplaySettings
+    turns: list[TurnTiming] = field(default_factory=list)
+    interruptions: int = 0
+
+    def reply_percentile(self, q: float) -> Optional[float]:
+        values = sorted(turn.reply_s for turn in self.turns)
+        return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+async def replay(path: Path, settings: ReplaySettings, instructions: str) -> ReplayResult:
+    samples, sample_rate = read_wav(path)
+    segments = speech_segments(samples, sample_rate)
+    script = path.with_suffix(".txt")
+    transcripts = script.read_text(encoding="utf-8").splitlines() if script.exists() else []
+
+    vad = silero.VAD.load(min_silence_duration=settings.min_silence_s, activation_threshold=settings.activation_threshold)
+    audio_input = ReplayAudioInput(samples, sample_rate, noise_suppression=settings.noise_suppression)
+    audio_output = ReplayAudioOutput()
+    vad_ends: list[float] = []
+    transcribed: list[float] = []
+
+    def on_user_state_changed(ev: UserStateChangedEvent) -> None:
+        if ev.old_state == "speaking":
+            vad_ends.append(time.monotonic())
+
+    async with (
+        StandInLLM(replies=list(AGENT_REPLIES), base_latency_s=settings.llm_latency_s) as stand_in_llm,
+        AgentSession(
+            stt=ScriptedSTT(transcripts, [end for _, end in segments], latency_s=settings.stt_latency_s),
+            llm=stand_in_llm,
+            tts=StandInTTS(),
+            vad=vad,
+            turn_detection="vad",
+            preemptive_generation=settings.preemptive,
+        ) as session,
+    ):
+        session.input.audio = audio_input
+        session.output.audio = audio_output
+        session.on("user_state_changed", on_user_state_changed)
+        session.on("user_input_transcribed", lambda ev: ev.is_final and transcribed.append(time.monotonic()))
+        await session.start(Agent(instructions=instructions))
+
+        started_at = time.monotonic()
+        audio_input.play(started_at)
+        await audio_input.finished.wait()
+        while session.agent_state in ("thinking", "speaking"):
+            await asyncio.sleep(0.1)
+        await audio_input.aclose()
+
+    def relative(times: list[float]) -> list[float]:
+        return [t - started_at for t in times]
+
+    return ReplayResult(
+        path=str(path),
+        settings=settings,
+        turns=match_turns(
+            segments,
+            relative(audio_output.playback_starts),
+            relative(vad_ends),
+            relative(transcribed),
+        ),
+        interruptions=audio_output.interruptions,
+    )
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def print_result(result: ReplayResult) -> None:
+    print(f"\n{Path(result.path).name} – {result.settings.label()}")
+    print(f"{'tour':>4}{'fin parole (s)':>16}{'VAD (ms)':>10}{'transcript (ms)':>17}{'réponse (ms)':>14}")
+    for index, turn in enumerate(result.turns, start=1):
+        print(f"{index:>4}{turn.caller_end_s:>16.2f}{_ms(turn.vad_s):>10}{_ms(turn.transcript_s):>17}{_ms(turn.reply_s):>14}")
+
+
+def print_comparison(results: list[ReplayResult]) -> None:
+    print(f"\n{'réglages':<48}{'tours':>6}{'p50 (ms)':>10}{'p95 (ms)':>10}{'VAD moy (ms)':>14}{'coupures':>10}")
+    for settings_label, group in itertools.groupby(results, key=lambda r: r.settings.label()):
+        group = list(group)
+        turns = [turn for result in group for turn in result.turns]
+        merged = ReplayResult(path="", settings=group[0].settings, turns=turns)
+        vad = [turn.vad_s for turn in turns if turn.vad_s is not None]
+        print(
+            f"{settings_label:<48}{len(turns):>6}{_ms(merged.reply_percentile(0.5)):>10}{_ms(merged.reply_percentile(0.95)):>10}"
+            f"{_ms(statistics.mean(vad) if vad else None):>14}{sum(r.interruptions for r in group):>10}"
+        )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Rejeu d'appels enregistrés : latence du tour de parole")
+    parser.add_argument("wavs", nargs="+", type=Path, help="enregistrements WAV mono 16 bits (8 kHz)")
+    parser.add_argument("--min-silence", nargs="+", type=float, default=[0.55], help="silero min_silence_duration (s)")
+    parser.add_argument("--activation-threshold", nargs="+", type=float, default=[0.5], help="silero activation_threshold")
+    parser.add_argument("--preemptive", nargs="+", choices=["on", "off"], default=["on"], help="preemptive_generation")
+    parser.add_argument("--noise-suppression", action="store_true", help="réduction de bruit WebRTC (APM) avant le VAD")
+    parser.add_argument("--stt-latency", type=float, default=0.2, help="délai de la transcription finale après la fin de parole (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="délai de la première réponse du modèle (s)")
+    parser.add_argument("--tenant", choices=sorted(TENANTS), default="telnek")
+    parser.add_argument("--json", type=Path, help="écrit le détail des tours dans ce fichier")
+    args = parser.parse_args()
+
+    tenant = TENANTS[args.tenant]
+    instructions = build_instructions(
+        agent_name, tenant.company_name, tenant.company_address, tenant.company_hours,
+        instructions_specific=tenant.instructions_specific,
+    ).text
+
+    results = []
+    for min_silence, threshold, preemptive in itertools.product(args.min_silence, args.activation_threshold, args.preemptive):
+        settings = ReplaySettings(
+            min_silence, threshold, preemptive == "on", args.noise_suppression, args.stt_latency, args.llm_latency,
+        )
+        for path in args.wavs:
+            result = await replay(path, settings, instructions)
+            print_result(result)
+            results.append(result)
+
+    print_comparison(results)
+    if args.json:
+        args.json.write_text(json.dumps([asdict(result) for result in results], ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
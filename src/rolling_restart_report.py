@@ -0,0 +1,148 @@
+"""
+Simulation hors ligne d'un redémarrage progressif (rolling restart) de la flotte de workers :
+taux de succès du cache des sites web et appels perdus, avec ou sans affinité compagnie ↔ worker
+(TENANT_GROUPS) et avec ou sans vidange (DRAIN_TIMEOUT_S).
+
+    uv run python src/rolling_restart_report.py --workers 4 --runs 20
+
+Modèle : arrivées de Poisson par compagnie, durées d'appel exponentielles, une partie des appels
+consulte une page du site. Chaque worker a son propre cache (perdu au redémarrage du conteneur) et
+reçoit l'appel s'il sert la compagnie et a de la place (le moins chargé d'abord). Les workers
+redémarrent un à la fois : vidange (ou coupure immédiate sans vidange), puis démarrage.
+"""
+import argparse
+import random
+import sys
+from dataclasses import dataclass, field
+from typing import Optional
+
+from dispatch import DRAIN_TIMEOUT_S
+from tenants import TENANT_GROUPS, TENANTS
+from website_cache import WEBSITE_CACHE_TTL_S
+
+CALLS_PER_MIN = {"telnek": 1.5, "electrizone": 0.75}
+MEAN_CALL_S = 150
+MAX_CALL_S = 1200
+WEBSITE_USE = 0.4  # part des appels qui consultent le site
+PAGES_PER_TENANT = 3
+CAPACITY = 6  # appels simultanés par worker
+STARTUP_S = 30
+SIM_S = 3 * 3600
+RESTART_AT_S = 3600 + 1800  # caches chauds avant le déploiement
+
+
+@dataclass
+class Arrival:
+    at: int
+    tenant: str
+    duration: int
+    page: Optional[int]
+
+
+@dataclass
+class Worker:
+    tenants: tuple[str, ...]
+    calls: list[int] = field(default_factory=list)  # fins d'appel
+    cache: dict[tuple[str, int], int] = field(default_factory=dict)
+    state: str = "up"  # up | draining | down
+    deadline: int = 0
+
+
+@dataclass
+class RunResult:
+    lookups: list[tuple[int, bool]] = field(default_factory=list)  # (instant, succès)
+    cut_off: int = 0  # appels coupés par l'arrêt d'un worker
+    unanswered: list[int] = field(default_factory=list)  # appels sans worker disponible
+    restart: tuple[int, int] = (0, 0)
+
+    def hits(self, restart_only: bool = False) -> tuple[int, int]:
+        start, end = self.restart if restart_only else (0, SIM_S)
+        window = [hit for at, hit in self.lookups if start <= at < end]
+        return sum(window), len(window)
+
+
+def generate_arrivals(rng: random.Random) -> list[Arrival]:
+    arrivals = []
+    for second in range(SIM_S):
+        for tenant in TENANTS:
+            if rng.random() < CALLS_PER_MIN.get(tenant, 0) / 60:
+                page = rng.randrange(PAGES_PER_TENANT) if rng.random() < WEBSITE_USE else None
+                arrivals.append(Arrival(second, tenant, int(min(MAX_CALL_S, rng.expovariate(1 / MEAN_CALL_S))) + 1, page))
+    return arrivals
+
+
+def simulate(arrivals: list[Arrival], workers_count: int, affinity: bool, drain_timeout: int, seed: int) -> RunResult:
+    rng = random.Random(seed)
+    groups = list(TENANT_GROUPS.values())
+    workers = [Worker(groups[index % len(groups)] if affinity else tuple(TENANTS)) for index in range(workers_count)]
+    queue = list(workers)
+    current: Optional[Worker] = None
+    result = RunResult()
+    restart_end = None
+    pending = iter(arrivals)
+    arrival = next(pending, None)
+
+    for now in range(SIM_S):
+        for worker in workers:
+            worker.calls = [end for end in worker.calls if end > now]
+
+        # Redémarrage progressif : un worker à la fois
+        if now >= RESTART_AT_S and current is None and queue:
+            current = queue.pop(0)
+            current.state, current.deadline = "draining", now + drain_timeout
+        if current and current.state == "draining" and (not current.calls or now >= current.deadline):
+            result.cut_off += len(current.calls)
+            current.calls, current.cache = [], {}
+            current.state, current.deadline = "down", now + STARTUP_S
+        elif current and current.state == "down" and now >= current.deadline:
+            current.state, current = "up", None
+            if not queue:
+                restart_end = now
+
+        while arrival and arrival.at == now:
+            candidates = [w for w in workers if w.state == "up" and arrival.tenant in w.tenants and len(w.calls) < CAPACITY]
+            if not candidates:
+                result.unanswered.append(now)
+            else:
+                fewest = min(len(w.calls) for w in candidates)
+                worker = rng.choice([w for w in candidates if len(w.calls) == fewest])
+                worker.calls.append(now + arrival.duration)
+                if arrival.page is not None:
+                    key = (arrival.tenant, arrival.page)
+                    hit = key in worker.cache and now - worker.cache[key] < WEBSITE_CACHE_TTL_S
+                    result.lookups.append((now, hit))
+                    if not hit:
+                        worker.cache[key] = now
+            arrival = next(pending, None)
+
+    result.restart = (RESTART_AT_S, restart_end or SIM_S)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Redémarrage progressif simulé : cache et appels perdus")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--drain-timeout", type=int, default=DRAIN_TIMEOUT_S, help="vidange (s) ; comparée à 0 (coupure)")
+    parser.add_argument("--runs", type=int, default=20, help="simulations (graines) cumulées par configuration")
+    args = parser.parse_args()
+
+    runs = [generate_arrivals(random.Random(seed)) for seed in range(args.runs)]
+    print(f"{args.runs} simulations de {SIM_S // 3600} h (~{sum(map(len, runs)) // args.runs} appels chacune), "
+          f"{args.workers} workers, cache TTL {WEBSITE_CACHE_TTL_S:.0f} s")
+    print(f"\n{'affinité':<10}{'vidange':>9}{'cache':>8}{'cache (redém.)':>16}{'redém. (min)':>14}{'coupés':>8}{'sans réponse':>14}")
+    for affinity in (False, True):
+        for drain_timeout in (0, args.drain_timeout):
+            results = [simulate(arrivals, args.workers, affinity, drain_timeout, seed) for seed, arrivals in enumerate(runs)]
+            hits, lookups = map(sum, zip(*(result.hits() for result in results)))
+            restart_hits, restart_lookups = map(sum, zip(*(result.hits(restart_only=True) for result in results)))
+            restart_min = sum(end - start for start, end in (result.restart for result in results)) / len(results) / 60
+            print(
+                f"{'oui' if affinity else 'non':<10}{f'{drain_timeout} s':>9}"
+                f"{hits / max(lookups, 1):>8.0%}{restart_hits / max(restart_lookups, 1):>16.0%}{restart_min:>14.1f}"
+                f"{sum(r.cut_off for r in results):>8}{sum(len(r.unanswered) for r in results):>14}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import asyncio
+import itertools
+import uuid
+from typing import Any, Optional
+
+from livekit.agents import APIConnectOptions, llm
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+from context_compaction import chat_ctx_tokens
+
+
+class StandInLLM(llm.LLM):
+    """
+    Modèle de remplacement pour les mesures hors ligne : répond un texte scripté après un délai
+    qui dépend de la taille du contexte (instructions + historique), comme un vrai modèle qui
+    doit relire tout le contexte à chaque tour. Aucun appel réseau.
+    """
+
+    def __init__(
+            self,
+            replies: Optional[list[str]] = None,
+            base_latency_s: float = 0.05,
+            ingest_s_per_1k_tokens: float = 0.02,
+            ) -> None:
+        super().__init__()
+        self._replies = itertools.cycle(replies or ["Bien sûr, je peux vous aider avec ça."])
+        self.base_latency_s = base_latency_s
+        self.ingest_s_per_1k_tokens = ingest_s_per_1k_tokens
+        self.context_tokens: list[int] = []  # taille du contexte reçu à chaque tour
+
+    @property
+    def model(self) -> str:
+        return "stand-in"
+
+    def next_reply(self) -> str:
+        return next(self._replies)
+
+    def chat(
+            self,
+            *,
+            chat_ctx: llm.ChatContext,
+            tools: Optional[list[llm.Tool]] = None,
+            conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+            **kwargs: Any,
+            ) -> "StandInLLMStream":
+        return StandInLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class StandInLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        stand_in: StandInLLM = self._llm  # type: ignore[assignment]
+        tokens = chat_ctx_tokens(self._chat_ctx)
+        stand_in.context_tokens.append(tokens)
+        await asyncio.sleep(stand_in.base_latency_s + stand_in.ingest_s_per_1k_tokens * tokens / 1000)
+        self._event_ch.send_nowait(
+            llm.ChatChunk(
+                id=str(uuid.uuid4()),
+                delta=llm.ChoiceDelta(role="assistant", content=stand_in.next_reply()),
+            )
+        )
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """Une compagnie servie par l'agent, reconnue par le préfixe du nom de la room."""
+    key: str
+    room_prefix: str
+    company_name: str
+    company_address: str
+    company_hours: str
+    admin_phone: str
+    callee_number: str
+    instructions_specific: str = ""
+
+
+TENANTS = {
+    "telnek": Tenant(
+        key="telnek",
+        room_prefix="telnek-",
+        company_name="Telnek",
+        company_address="sept cents soixante et quatre, Avenue Prieur à Laval, Québec. H7E 2V3",
+        company_hours="lundi au vendredi de 9 heure du matin a 5 heure de l'après-midi",
+        admin_phone="+15149474976",
+        callee_number="+14388147547",
+        instructions_specific=(
+            "Telnek est une entreprise spécialisée dans les services de centre d'appels, de télémarketing et de centre de contact.\n"
+        ),
+    ),
+    "electrizone": Tenant(
+        key="electrizone",
+        room_prefix="electrizone-",
+        company_name="ÉlectriZone",
+        company_address="deux milles dix, rue Alphonse, à Saint-Pascal, Québec. G0L 3Y0",
+        company_hours="lundi au vendredi de 8 heure à 17 heure",
+        admin_phone="+15149474976",
+        callee_number="+14388141491",
+        instructions_specific=(
+            "Le nom de l’entreprise est « ÉlectriZone », prononcé « Élec-tri » légère pause puis « Zone » (accent sur Zone). Jamais « Électric Zone » ou « Électrique Zone ».\n"
+            "ÉlectriZone se spécialise dans les services électriques résidentiel, commercial et agricole.\n"
+            "Propriétaire : Guillaume Boucher.\n"
+            "Région desservie : Kamouraska et environs.\n"
+            "Pour plus de détails ou projets en cours, mentionne que nous sommes actifs sur Facebook (ÉlectriZone).\n"
+            "Ajout pour la prise de message pour électrizone: \n"
+            "- Après avoir la raison de l’appel, demande toujours : « Est-ce que c’est pour une installation résidentielle, commerciale ou agricole ? »\n"
+            "- Attends la réponse avant de continuer vers le numéro/nom/récap.\n"
+        ),
+    ),
+}
+
+UNKNOWN_TENANT = Tenant(
+    key="Inconnue",
+    room_prefix="Inconnue",
+    company_name="Inconnue",
+    company_address="Inconnue",
+    company_hours="Inconnue",
+    admin_phone="Inconnue",
+    callee_number="Inconnue",
+)
+
+
+def tenant_for_room(room_name: str) -> Tenant:
+    """Détection du client par le nom de la room (ex. "telnek-_+15145551234_abcd")."""
+    for tenant in TENANTS.values():
+        if room_name.startswith(tenant.room_prefix):
+            return tenant
+    return UNKNOWN_TENANT
+
+
+# Groupes de compagnies servis par un même pool de workers (affinité : état chaud par compagnie)
+TENANT_GROUPS = {
+    "telnek": ("telnek",),
+    "electrizone": ("electrizone",),
+}
+
+
+def tenants_for_group(group: str) -> tuple[str, ...]:
+    """Compagnies d'un groupe ; groupe vide = toutes les compagnies (dispatch automatique, sans affinité)."""
+    if not group:
+        return tuple(TENANTS)
+    if group not in TENANT_GROUPS:
+        raise ValueError(f"Groupe de compagnies inconnu : {group!r} (connus : {', '.join(TENANT_GROUPS)})")
+    return TENANT_GROUPS[group]
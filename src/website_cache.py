@@ -0,0 +1,66 @@
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("agent")
+
+# Texte des pages des compagnies, partagé par les processus du worker (une base par worker / volume)
+WEBSITE_CACHE_DB = os.getenv("WEBSITE_CACHE_DB", str(Path(__file__).resolve().parent.parent / "data" / "website_cache.sqlite3"))
+WEBSITE_CACHE_TTL_S = float(os.getenv("WEBSITE_CACHE_TTL_S", "3600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url        TEXT PRIMARY KEY,
+    text       TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class WebsiteCache:
+    """
+    Cache des pages déjà extraites par fetch_company_website. Chaque appel tourne dans son propre
+    processus : le cache est dans SQLite pour servir les appels suivants du même worker, ce qui
+    profite surtout aux workers dédiés à un groupe de compagnies (affinité).
+    """
+
+    def __init__(self, path: str = WEBSITE_CACHE_DB, ttl_s: float = WEBSITE_CACHE_TTL_S) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM pages WHERE url = ? AND fetched_at > ?",
+                (url, time.time() - self.ttl_s),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, url: str, text: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, text, fetched_at) VALUES (?, ?, ?)",
+                (url, text, time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@functools.cache
+def website_cache() -> WebsiteCache:
+    """Cache partagé par tous les appels du processus (ouvert au prewarm)."""
+    return WebsiteCache(WEBSITE_CACHE_DB)
@@ -0,0 +1,41 @@
+import asyncio
+
+from background_tasks import TaskSupervisor
+from call_metrics import CallMetrics
+
+
+async def test_failures_and_timeouts_are_captured() -> None:
+    metrics = CallMetrics()
+    supervisor = TaskSupervisor(metrics)
+
+    async def fails():
+        raise RuntimeError("Twilio indisponible")
+
+    supervisor.start(asyncio.sleep(0), name="ok")
+    supervisor.start(fails(), name="sms")
+    supervisor.start(asyncio.sleep(1), name="lent", timeout=0.01)
+    await supervisor.drain(timeout=1)
+
+    assert metrics.count("background.succeeded") == 1
+    assert metrics.count("background.failed") == 1
+    assert metrics.count("background.timed_out") == 1
+    assert [name for name, _ in supervisor.errors] == ["sms", "lent"]
+
+
+async def test_drain_waits_then_cancels_stragglers() -> None:
+    metrics = CallMetrics()
+    supervisor = TaskSupervisor(metrics)
+    finished = []
+
+    async def send(name, delay):
+        await asyncio.sleep(delay)
+        finished.append(name)
+
+    supervisor.start(send("rapide", 0.01), name="rapide")
+    bloque = supervisor.start(send("bloqué", 10), name="bloqué", timeout=None)
+    await supervisor.drain(timeout=0.1)
+
+    assert finished == ["rapide"]
+    assert bloque.cancelled()
+    assert supervisor.pending == []
+    assert metrics.count("background.pending_at_shutdown") == 1
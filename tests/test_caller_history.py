@@ -0,0 +1,30 @@
+from caller_history import LOOKUP_SQL, CallerHistory, normalize_number
+
+
+def test_record_then_lookup_by_any_number_format(tmp_path) -> None:
+    history = CallerHistory(str(tmp_path / "history.sqlite3"))
+    history.record("telnek", "+15145550123", "Marie Tremblay", "450-808-0813", "Soumission")
+    history.record("telnek", "5145550123", "Marie Tremblay", "4508080813", "Suivi")
+
+    record = history.lookup("telnek", "sip_+1 (514) 555-0123")
+
+    assert record.name == "Marie Tremblay"
+    assert record.callback_number == "4508080813"
+    assert record.last_reason == "Suivi"
+    assert record.call_count == 2
+    assert history.lookup("electrizone", "5145550123") is None
+    assert history.lookup("telnek", "") is None
+
+
+def test_normalize_number() -> None:
+    assert normalize_number("+1 514-555-0123") == "5145550123"
+    assert normalize_number("15145550123") == "5145550123"
+    assert normalize_number("inconnu") == ""
+
+
+def test_lookup_is_a_primary_key_search() -> None:
+    history = CallerHistory(":memory:")
+
+    plan = history._conn.execute(f"EXPLAIN QUERY PLAN {LOOKUP_SQL}", ("telnek", "5145550123")).fetchall()
+
+    assert [row[-1] for row in plan] == ["SEARCH callers USING PRIMARY KEY (tenant=? AND number=?)"]
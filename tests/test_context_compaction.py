@@ -0,0 +1,77 @@
+import json
+
+from livekit.agents import Agent, AgentSession
+
+from call_metrics import CallMetrics
+from context_compaction import (
+    COMPACT_AFTER_TOKENS,
+    COMPACT_AFTER_TURNS,
+    ContextCompactor,
+    format_summary,
+    parse_summary,
+)
+from prompt import build_instructions
+from stand_in_llm import StandInLLM
+from tenants import TENANTS
+
+SUMMARY = {"nom": "Julie Tremblay", "numero_rappel": "5145550123", "raison": "panneau 200 A", "details": None}
+
+
+def test_summary_is_parsed_from_model_text() -> None:
+    text = f"Voici le résumé :\n```json\n{json.dumps(SUMMARY)}\n```"
+
+    summary = format_summary(parse_summary(text))
+
+    assert "- nom : Julie Tremblay" in summary
+    assert "- numero_rappel : 5145550123" in summary
+    assert "details" not in summary  # champs vides omis
+
+
+async def test_old_turns_are_replaced_by_summary() -> None:
+    metrics = CallMetrics()
+    async with (
+        StandInLLM(replies=["D'accord."], base_latency_s=0) as stand_in,
+        StandInLLM(replies=[json.dumps(SUMMARY)], base_latency_s=0) as summarizer,
+        AgentSession(llm=stand_in) as session,
+    ):
+        agent = Agent(instructions="Tu es Amélie, réceptionniste.")
+        await session.start(agent)
+        compactor = ContextCompactor(session, agent, summarizer, metrics, max_turns=1000, keep_last_turns=1)
+        for user_input in ("Bonjour", "Je m'appelle Julie Tremblay", "C'est pour le panneau"):
+            await session.run(user_input=user_input)
+
+        assert await compactor.compact()
+        compactor.close()
+
+        messages = [item for item in agent.chat_ctx.items if item.type == "message"]
+        assert messages[0].role == "system"  # instructions conservées
+        assert messages[1].extra.get("is_summary")
+        assert "Julie Tremblay" in messages[1].text_content
+        assert [msg.text_content for msg in messages[2:]] == ["C'est pour le panneau", "D'accord."]
+    assert metrics.count("compaction.done") == 1
+
+
+async def test_tenant_prompt_alone_does_not_trigger_compaction() -> None:
+    tenant = TENANTS["electrizone"]
+    instructions = build_instructions(
+        "Amélie", tenant.company_name, tenant.company_address, tenant.company_hours,
+        caller_number="+15145550123",
+        spoken_caller="cinq un quatre... cinq cinq cinq... zéro un deux trois",
+        instructions_specific=tenant.instructions_specific,
+    )
+    assert instructions.tokens > COMPACT_AFTER_TOKENS  # le prompt seul dépasse déjà le seuil
+
+    metrics = CallMetrics()
+    async with (
+        StandInLLM(replies=["D'accord."], base_latency_s=0) as stand_in,
+        StandInLLM(replies=[json.dumps(SUMMARY)], base_latency_s=0) as summarizer,
+        AgentSession(llm=stand_in) as session,
+    ):
+        agent = Agent(instructions=instructions.text)
+        await session.start(agent)
+        compactor = ContextCompactor(session, agent, summarizer, metrics)
+        for index in range(COMPACT_AFTER_TURNS // 2):  # reste sous la limite de tours
+            await session.run(user_input=f"Précision numéro {index} sur mon projet")
+        compactor.close()
+
+    assert metrics.count("compaction.done") == 0
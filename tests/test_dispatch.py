@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from dispatch import dispatch_agent_name, served_tenants
+from tenants import TENANTS
+from website_cache import WebsiteCache
+
+
+def test_worker_group_registers_its_agent_name() -> None:
+    assert dispatch_agent_name("telnek") == "receptionniste-telnek"
+    assert served_tenants("telnek") == ("telnek",)
+
+
+def test_worker_without_group_serves_every_tenant() -> None:
+    assert dispatch_agent_name("") == ""  # dispatch automatique, comme avant
+    assert served_tenants("") == tuple(TENANTS)
+
+
+def test_unknown_group_fails_at_startup() -> None:
+    with pytest.raises(ValueError):
+        dispatch_agent_name("bell")
+
+
+def test_website_cache_expires(tmp_path) -> None:
+    cache = WebsiteCache(str(tmp_path / "website_cache.sqlite3"), ttl_s=0.05)
+    cache.put("https://telnek.com/", "Centre d'appels")
+
+    assert WebsiteCache(str(tmp_path / "website_cache.sqlite3")).get("https://telnek.com/") == "Centre d'appels"
+    time.sleep(0.06)
+    assert cache.get("https://telnek.com/") is None
@@ -0,0 +1,104 @@
+import asyncio
+import wave
+
+import pytest
+from livekit import rtc
+
+import filler
+from call_metrics import CallMetrics
+from filler import ToolLatencyMasker, load_filler_clips
+from render_filler_clips import write_clip
+
+
+class _Handle:
+    def __init__(self) -> None:
+        self.interrupted = False
+
+    def done(self) -> bool:
+        return self.interrupted
+
+    def interrupt(self) -> None:
+        self.interrupted = True
+
+
+class _Session:
+    """Session minimale : seulement ce que ToolLatencyMasker utilise."""
+
+    def __init__(self) -> None:
+        self.agent_state = "thinking"
+        self.handlers = {}
+        self.said = []
+
+    def on(self, event, callback):
+        self.handlers[event] = callback
+
+    def off(self, event, callback):
+        self.handlers.pop(event, None)
+
+    def say(self, text, **kwargs):
+        handle = _Handle()
+        self.said.append((text, handle))
+        return handle
+
+
+@pytest.fixture
+def clip_dir(tmp_path, monkeypatch):
+    tenant_dir = tmp_path / "telnek"
+    tenant_dir.mkdir()
+    with wave.open(str(tenant_dir / "01.wav"), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\x00\x00" * 8000)  # 1 seconde
+    (tenant_dir / "01.txt").write_text("Un instant, je regarde ça…", encoding="utf-8")
+    monkeypatch.setattr(filler, "FILLER_AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(filler, "_clip_cache", {})
+    return tmp_path
+
+
+def test_load_filler_clips_splits_20ms_frames(clip_dir) -> None:
+    clips = load_filler_clips("telnek")
+
+    assert len(clips) == 1
+    assert clips[0].text == "Un instant, je regarde ça…"
+    assert len(clips[0].frames) == 50
+    assert clips[0].frames[0].samples_per_channel == 160
+    assert load_filler_clips("electrizone") == []
+
+
+def test_rendered_clip_is_loadable(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(filler, "FILLER_AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(filler, "_clip_cache", {})
+    frame = rtc.AudioFrame.create(sample_rate=24000, num_channels=1, samples_per_channel=24000)  # sortie realtime
+
+    write_clip(frame, "Un instant, je vérifie…", tmp_path / "electrizone" / "attente_01.wav")
+
+    [clip] = load_filler_clips("electrizone")
+    assert clip.text == "Un instant, je vérifie…"
+    assert len(clip.frames) == 50
+
+
+async def test_filler_plays_after_threshold_and_is_cut(clip_dir) -> None:
+    session = _Session()
+    metrics = CallMetrics()
+    masker = ToolLatencyMasker(session, "telnek", metrics, threshold=0.01, holdout=0)
+
+    async with masker.mask("take_message"):
+        await asyncio.sleep(0.05)
+
+    assert len(session.said) == 1
+    assert session.said[0][1].interrupted
+    assert metrics.count("filler.played") == 1
+    assert metrics.count("filler.cut") == 1
+
+
+async def test_fast_tool_gets_no_filler(clip_dir) -> None:
+    session = _Session()
+    metrics = CallMetrics()
+    masker = ToolLatencyMasker(session, "telnek", metrics, threshold=0.5, holdout=0)
+
+    async with masker.mask("fetch_company_website"):
+        pass
+
+    assert session.said == []
+    assert metrics.count("filler.slow_waits") == 0
@@ -0,0 +1,106 @@
+import logging
+import tracemalloc
+
+import pytest
+from livekit import rtc
+
+from agent import html_to_text, start_call_lifecycle
+from background_tasks import TaskSupervisor
+from call_metrics import CallMetrics
+from filler import ToolLatencyMasker
+from memory_diagnostics import MemoryDiagnostics
+from notifications import NotificationAggregator
+
+SOAK_CALLS = 300
+MAX_RETAINED_BYTES = 64 * 1024
+
+PAGE = (
+    "<html><head><style>p {}</style><script>var x = 1;</script></head><body>"
+    + "<nav>menu</nav>"
+    + "".join(f"<p>Service électrique {i} à Saint-Pascal</p>" for i in range(50))
+    + "</body></html>"
+)
+
+
+class _Session(rtc.EventEmitter):
+    agent_state = "thinking"
+
+    def say(self, text, **kwargs):
+        raise AssertionError("pas de clip pendant le soak")
+
+
+class _Room(rtc.EventEmitter):
+    name = "telnek-soak"
+
+
+class _Assistant:
+    """Ce que my_agent accroche à l'Assistant (métriques, tâches, clips, room), sans le modèle realtime."""
+
+    def __init__(self, room: _Room) -> None:
+        self.metrics = CallMetrics("soak")
+        self.tasks = TaskSupervisor(self.metrics)
+        self.filler = ToolLatencyMasker(_Session(), "telnek", self.metrics, threshold=60, holdout=0)
+        self.room = room
+
+
+async def _no_sms(to_number, from_number, body) -> None:
+    pass
+
+
+@pytest.fixture
+def notifications(tmp_path):
+    aggregator = NotificationAggregator(_no_sms, path=str(tmp_path / "notifications.sqlite3"), metrics=CallMetrics())
+    yield aggregator
+    aggregator.close()
+
+
+@pytest.fixture
+def stop_tracemalloc():
+    yield
+    tracemalloc.stop()  # sinon les tests suivants tournent avec le traçage actif
+
+
+async def _simulated_call(room: _Room, notifications: NotificationAggregator) -> None:
+    """Cycle de vie de my_agent (start_call_lifecycle / finish_call) autour des tools et tâches de fond."""
+    assistant = _Assistant(room)
+    finish_call = start_call_lifecycle(room, assistant)
+
+    async with assistant.filler.mask("fetch_company_website"):
+        assert "Saint-Pascal" in html_to_text(PAGE)
+    assistant.tasks.start(
+        notifications.notify("telnek", "Telnek", "+1514", "+1438", "Message du soak"), name="take_message_sms"
+    )
+
+    await finish_call()
+
+
+async def test_memory_stays_flat_over_many_calls(caplog, notifications, stop_tracemalloc) -> None:
+    # Sinon pytest garde chaque LogRecord en mémoire et fausse la mesure
+    caplog.set_level(logging.WARNING, logger="agent")
+    room = _Room()
+    for _ in range(20):  # réchauffe les caches (imports, parseur, interning, SQLite)
+        await _simulated_call(room, notifications)
+
+    diagnostics = MemoryDiagnostics()
+    diagnostics.start()
+    for _ in range(SOAK_CALLS):
+        await _simulated_call(room, notifications)
+    report = diagnostics.finish()
+
+    assert report.retained_bytes < MAX_RETAINED_BYTES, report.by_site
+    assert room._events.get("transcription_received", set()) == set()
+
+
+def test_diagnostics_report_retained_objects(stop_tracemalloc) -> None:
+    class Fuite:
+        pass
+
+    diagnostics = MemoryDiagnostics()
+    diagnostics.start()
+    leaked = [Fuite() for _ in range(1000)]
+    report = diagnostics.finish()
+
+    assert ("test_diagnostics_report_retained_objects.<locals>.Fuite", 1000) in report.by_type
+    assert report.retained_bytes > 0
+    assert any(__file__ in site for site, _, _ in report.by_site)
+    del leaked
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+from livekit import rtc
+
+from agent import start_call_lifecycle
+from background_tasks import TaskSupervisor
+from call_metrics import CallMetrics
+from notifications import NotificationAggregator, digest_bodies
+
+
+class _Sender:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def __call__(self, to_number, from_number, body):
+        self.sent.append((to_number, from_number, body))
+
+
+def _aggregator(tmp_path, sender, window_s=60):
+    return NotificationAggregator(sender, path=str(tmp_path / "notifications.sqlite3"), window_s=window_s, metrics=CallMetrics())
+
+
+async def test_burst_is_sent_as_one_digest_when_window_closes(tmp_path) -> None:
+    sender = _Sender()
+    aggregator = _aggregator(tmp_path, sender)
+    for name in ("Marie", "Jean", "Luc"):
+        await aggregator.notify("telnek", "Telnek", "+15149474976", "+14388147547", f"De : {name}")
+
+    assert await aggregator.flush() == 0  # fenêtre encore ouverte
+    aggregator.window_s = 0.01
+    time.sleep(0.02)
+    assert await aggregator.flush() == 1
+
+    to_number, _, body = sender.sent[0]
+    assert to_number == "+15149474976"
+    assert body.startswith("📬 3 nouveaux messages Telnek")
+    assert "3) De : Luc" in body
+    assert aggregator.metrics.count("admin_sms.coalesced") == 3
+
+
+async def test_urgent_message_is_sent_right_away(tmp_path) -> None:
+    sender = _Sender()
+    aggregator = _aggregator(tmp_path, sender)
+
+    await aggregator.notify("electrizone", "ÉlectriZone", "+15149474976", "+14388141491", "Panne", urgent=True)
+
+    assert [body for _, _, body in sender.sent] == ["Panne"]
+    assert aggregator.metrics.count("admin_sms.queued") == 0
+
+
+async def test_pending_messages_survive_a_restart(tmp_path) -> None:
+    await _aggregator(tmp_path, _Sender()).notify("telnek", "Telnek", "+1514", "+1438", "Avant redémarrage")
+
+    sender = _Sender()
+    restarted = _aggregator(tmp_path, sender, window_s=0)
+    assert await restarted.flush() == 1
+    assert sender.sent[0][2] == "Avant redémarrage"
+
+
+class _Room(rtc.EventEmitter):
+    name = "telnek-appel"
+
+
+class _Assistant:
+    def __init__(self) -> None:
+        self.metrics = CallMetrics()
+        self.tasks = TaskSupervisor(self.metrics)
+        self.filler = None
+        self.room = _Room()
+
+
+async def test_sequential_calls_share_one_digest(tmp_path) -> None:
+    sender = _Sender()
+    aggregator = _aggregator(tmp_path, sender, window_s=0.3)
+    for name in ("Marie", "Jean", "Luc"):  # trois appels qui ne se chevauchent pas, dans la même fenêtre
+        assistant = _Assistant()
+        finish_call = start_call_lifecycle(assistant.room, assistant)
+        assistant.tasks.start(aggregator.notify("telnek", "Telnek", "+1514", "+1438", f"De : {name}"), name="take_message_sms")
+        await finish_call()
+    assert sender.sent == []  # la fin d'un appel n'envoie rien
+
+    sweeper = asyncio.create_task(aggregator.run_sweeper(interval_s=0.05))  # processus principal du worker
+    await asyncio.sleep(0.5)
+    sweeper.cancel()
+
+    assert len(sender.sent) == 1
+    assert sender.sent[0][2].startswith("📬 3 nouveaux messages Telnek")
+
+
+async def test_worker_drain_sends_pending_messages(tmp_path) -> None:
+    sender = _Sender()
+    aggregator = _aggregator(tmp_path, sender)
+    await aggregator.notify("telnek", "Telnek", "+1514", "+1438", "Avant l'arrêt")
+
+    assert await aggregator.drain() == 1  # arrêt du worker : la fenêtre n'est pas attendue
+    assert sender.sent[0][2] == "Avant l'arrêt"
+
+
+def test_long_digest_is_split() -> None:
+    digests = digest_bodies("Telnek", ["x" * 600] * 5, max_chars=1500)
+
+    assert len(digests) == 3
+    assert all(digest.startswith("📬 5 nouveaux messages Telnek") for digest in digests)
+
+
+async def test_only_unsent_parts_are_requeued(tmp_path) -> None:
+    class _FailsOnSecond(_Sender):
+        async def __call__(self, to_number, from_number, body):
+            if len(self.sent) == 1:
+                raise RuntimeError("Twilio indisponible")
+            await super().__call__(to_number, from_number, body)
+
+    aggregator = _aggregator(tmp_path, _FailsOnSecond(), window_s=0.01)
+    for index in range(5):
+        await aggregator.notify("telnek", "Telnek", "+1514", "+1438", f"{index}" * 600)
+    time.sleep(0.02)
+    assert await aggregator.flush() == 1
+
+    sender = _Sender()
+    aggregator.sender = sender
+    await aggregator.drain()
+    assert all("0" * 600 not in body and "1" * 600 not in body for _, _, body in sender.sent)  # 1re partie déjà envoyée
+    assert sum(body.count(") ") for _, _, body in sender.sent) == 3
@@ -0,0 +1,93 @@
+from prompt import (
+    PROMPT_TOKEN_BUDGET,
+    PromptSection,
+    assemble_prompt,
+    build_instructions,
+)
+from tenants import TENANTS
+
+
+def _tenant_prompt(tenant, budget=PROMPT_TOKEN_BUDGET):
+    return build_instructions(
+        "Amélie",
+        tenant.company_name,
+        tenant.company_address,
+        tenant.company_hours,
+        caller_number="+15145550123",
+        spoken_caller="cinq un quatre... cinq cinq cinq... zéro un deux trois",
+        instructions_specific=tenant.instructions_specific,
+        budget=budget,
+    )
+
+
+def test_each_rule_is_stated_once() -> None:
+    text = _tenant_prompt(TENANTS["telnek"]).text.lower()
+
+    assert text.count("une seule question") == 2  # règle + résumé
+    assert text.count("3-3-4") == 1
+    assert text.count("fetch_company_website") == 1
+
+
+def test_tenant_prompts_fit_budget() -> None:
+    for tenant in TENANTS.values():
+        compiled = _tenant_prompt(tenant)
+        assert not compiled.over_budget, (tenant.key, compiled.tokens)
+        assert compiled.dropped == []
+
+
+def test_repeated_lines_are_removed() -> None:
+    compiled = assemble_prompt([
+        PromptSection("base", "- Une seule question à la fois.\nVouvoie l'appelant.\n"),
+        PromptSection("specifique", "Une seule question à la fois.\nPropriétaire : Guillaume Boucher.\n"),
+    ])
+
+    assert compiled.duplicate_lines == 1
+    assert compiled.text.count("Une seule question") == 1
+
+
+def test_optional_sections_dropped_when_over_budget() -> None:
+    full = _tenant_prompt(TENANTS["electrizone"])
+    compiled = _tenant_prompt(TENANTS["electrizone"], budget=full.tokens - 1)
+
+    assert compiled.dropped == ["resume"]
+    assert "resume" not in compiled.sections
+    assert compiled.tokens < full.tokens
+
+
+def test_known_caller_is_greeted_by_name() -> None:
+    tenant = TENANTS["telnek"]
+    compiled = build_instructions(
+        "Amélie",
+        tenant.company_name,
+        tenant.company_address,
+        tenant.company_hours,
+        caller_number="+15145550123",
+        caller_name="Marie Tremblay",
+        spoken_callback="quatre cinq zéro... huit zéro huit... zéro huit un trois",
+    )
+
+    assert "appelant_connu" in compiled.sections
+    assert "numero_appelant" not in compiled.sections
+    assert "Bonjour Marie Tremblay, vous êtes bien chez Telnek" in compiled.text
+    assert "même numéro, le quatre cinq zéro" in compiled.text
+    assert "Je peux utiliser le numéro d'où vous appelez" not in compiled.text
+    assert "Demande le nom complet" not in compiled.text
+
+
+def test_known_caller_without_spoken_callback_is_offered_current_number() -> None:
+    tenant = TENANTS["telnek"]
+    compiled = build_instructions(
+        "Amélie",
+        tenant.company_name,
+        tenant.company_address,
+        tenant.company_hours,
+        caller_number="+15145550123",
+        spoken_caller="cinq un quatre... cinq cinq cinq... zéro un deux trois",
+        caller_name="Marie Tremblay",
+        spoken_callback=None,  # numéro mémorisé qui n'a pas 10 chiffres
+    )
+
+    assert "numero_appelant" in compiled.sections
+    assert "même numéro" not in compiled.text
+    assert "qui est le cinq un quatre" in compiled.text
+    assert "Demande le nom complet" not in compiled.text
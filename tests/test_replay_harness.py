@@ -0,0 +1,85 @@
+import wave
+
+import numpy as np
+
+from replay_harness import ReplaySettings, match_turns, replay, speech_segments
+
+SAMPLE_RATE = 8000
+
+
+def _call(*parts: tuple[str, float]) -> np.ndarray:
+    """Parole simulée (bruit fort) et silences, en secondes."""
+    rng = np.random.default_rng(0)
+    chunks = []
+    for kind, seconds in parts:
+        n = int(seconds * SAMPLE_RATE)
+        chunks.append((rng.standard_normal(n) * 6000).astype(np.int16) if kind == "parole" else np.zeros(n, dtype=np.int16))
+    return np.concatenate(chunks)
+
+
+def _resonate(x: np.ndarray, freq: float, bandwidth: float = 100.0) -> np.ndarray:
+    """Résonateur du 2e ordre (formant), sans scipy."""
+    r = np.exp(-np.pi * bandwidth / SAMPLE_RATE)
+    c1, c2 = 2 * r * np.cos(2 * np.pi * freq / SAMPLE_RATE), -r * r
+    y = np.zeros(len(x))
+    y1 = y2 = 0.0
+    for index, value in enumerate(x):
+        y1, y2 = (1 - r) * value + c1 * y1 + c2 * y2, y1
+        y[index] = y1
+    return y
+
+
+def _voiced(seconds: float) -> np.ndarray:
+    """Voix synthétique que Silero reconnaît : impulsions à 120 Hz, deux formants qui changent par syllabe."""
+    n = int(seconds * SAMPLE_RATE)
+    pulses = np.zeros(n)
+    pulses[::SAMPLE_RATE // 120] = 1.0
+    syllable = SAMPLE_RATE // 5
+    out = np.zeros(n)
+    for index, start in enumerate(range(0, n, syllable)):
+        f1, f2 = ((700, 1200), (300, 2300), (500, 900), (400, 1900))[index % 4]
+        segment = _resonate(_resonate(pulses[start:start + syllable], f1), f2)
+        out[start:start + len(segment)] = segment * np.sin(np.linspace(0, np.pi, len(segment))) ** 0.5
+    return out / np.abs(out).max() * 0.5
+
+
+def test_speech_segments_bridge_short_pauses() -> None:
+    samples = _call(("silence", 0.5), ("parole", 1.0), ("silence", 0.1), ("parole", 0.5), ("silence", 2.0), ("parole", 1.0))
+
+    segments = speech_segments(samples, SAMPLE_RATE)
+
+    assert [(round(start, 2), round(end, 2)) for start, end in segments] == [(0.5, 2.1), (4.1, 5.1)]
+
+
+def test_each_reply_is_matched_to_the_caller_turn_before_it() -> None:
+    segments = [(0.5, 2.0), (4.0, 5.0)]
+
+    turns = match_turns(
+        segments,
+        playback_starts=[0.1, 3.0, 3.5, 6.2],  # accueil, réponse, suite de la réponse, réponse
+        vad_ends=[2.6, 5.6],
+        transcripts=[2.8, 5.8],
+    )
+
+    assert [round(turn.reply_s, 2) for turn in turns] == [1.0, 1.2]
+    assert [round(turn.vad_s, 2) for turn in turns] == [0.6, 0.6]
+    assert [round(turn.transcript_s, 2) for turn in turns] == [0.8, 0.8]
+
+
+async def test_preemptive_generation_lowers_reply_time(tmp_path) -> None:
+    path = tmp_path / "appel.wav"
+    samples = np.concatenate([np.zeros(SAMPLE_RATE // 2), _voiced(1.6), np.zeros(SAMPLE_RATE // 2)])
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((samples * 32767).astype(np.int16).tobytes())
+
+    replies = {}
+    for preemptive in (True, False):
+        result = await replay(path, ReplaySettings(min_silence_s=0.55, activation_threshold=0.5, preemptive=preemptive), "Tu es Amélie.")
+        [turn] = result.turns
+        assert turn.transcript_s < turn.vad_s  # transcription finale avant la fin de parole selon le VAD
+        replies[preemptive] = turn.reply_s
+
+    assert replies[True] < replies[False] - 0.2  # le modèle (0,6 s) a commencé pendant le silence du VAD